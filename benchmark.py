@@ -0,0 +1,407 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import hashlib
+import argparse
+import tempfile
+import datetime
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource  # Not available on Windows
+except ImportError:
+    resource = None
+
+from file_utils import (
+    collect_file_paths,
+    separate_files_by_type,
+    read_file_data
+)
+
+from data_processing_common import (
+    compute_operations,
+    execute_operations,
+    process_files_by_date,
+    process_files_by_type,
+)
+
+from text_data_processing import process_text_files
+from image_data_processing import process_image_files
+
+# Default share of each file kind in a synthetic corpus
+DEFAULT_MIX = {
+    'txt': 20, 'md': 10, 'docx': 10, 'pdf': 10, 'xlsx': 5, 'csv': 10,
+    'pptx': 5, 'png': 10, 'jpg': 15, 'gif': 5,
+}
+
+# Stages compared by default when gating regressions (inference is dominated by the stub latency)
+DEFAULT_GATED_STAGES = ('walk', 'read', 'plan', 'execute')
+
+WORDS = [
+    'budget', 'invoice', 'meeting', 'notes', 'travel', 'itinerary', 'recipe', 'chocolate', 'physics', 'theory',
+    'climate', 'polar', 'bear', 'report', 'quarterly', 'sales', 'marketing', 'strategy', 'garden', 'mountain',
+    'sunset', 'ocean', 'research', 'network', 'database', 'history', 'music', 'finance', 'health', 'school',
+]
+
+
+class StubInference:
+    """Deterministic stand-in for the Nexa text and VLM inference classes with injected latency."""
+
+    def __init__(self, latency=0.0, token_latency=0.0):
+        self.latency = latency
+        self.token_latency = token_latency
+        self.calls = 0
+
+    def _words_for(self, prompt, count):
+        digest = hashlib.sha256(prompt.encode('utf-8', errors='ignore')).digest()
+        return [WORDS[digest[i % len(digest)] % len(WORDS)] for i in range(count)]
+
+    def _answer(self, prompt):
+        tail = prompt.rstrip()[-20:].lower()
+        if tail.endswith('filename:'):
+            return '_'.join(self._words_for(prompt, 3))
+        if tail.endswith('category:'):
+            return self._words_for(prompt, 1)[0]
+        return 'A document about ' + ' and '.join(self._words_for(prompt, 12)) + '.'
+
+    def _sleep(self, tokens):
+        delay = self.latency + self.token_latency * tokens
+        if delay > 0:
+            time.sleep(delay)
+
+    def create_completion(self, prompt, max_tokens=None, stream=False, **kwargs):
+        self.calls += 1
+        words = self._answer(prompt).split(' ')[:max_tokens]
+        if not stream:
+            self._sleep(len(words))
+            return {'choices': [{'text': ' '.join(words)}]}
+        return self._stream(words)
+
+    def _stream(self, words):
+        # Latency is paid per streamed word, so an early stop by the consumer saves time like a real model
+        for i, word in enumerate(words):
+            if i == 0:
+                self._sleep(1)
+            elif self.token_latency > 0:
+                time.sleep(self.token_latency)
+            yield {'choices': [{'text': (' ' if i else '') + word}]}
+
+    def _chat(self, prompt, image_path):
+        self.calls += 1
+        text = 'A photo of ' + ' and '.join(self._words_for(prompt + image_path, 10)) + '.'
+        for i, word in enumerate(text.split(' ')):
+            if i == 0:
+                self._sleep(1)
+            elif self.token_latency > 0:
+                time.sleep(self.token_latency)
+            yield {'choices': [{'delta': {'content': word + ' '}}]}
+
+
+def parse_mix(value):
+    """Parse a mix specification like 'txt=30,png=10' into a dict."""
+    mix = {}
+    for item in value.split(','):
+        ext, _, weight = item.partition('=')
+        mix[ext.strip().lower()] = float(weight or 1)
+    return mix
+
+
+def _sentences(rng, count):
+    return ' '.join(' '.join(rng.choice(WORDS) for _ in range(rng.randint(6, 14))).capitalize() + '.' for _ in range(count))
+
+
+def _write_synthetic_file(path, ext, rng):
+    """Write one synthetic file of the given kind."""
+    if ext in ('txt', 'md'):
+        with open(path, 'w', encoding='utf-8') as f:
+            if ext == 'md':
+                f.write('# ' + rng.choice(WORDS).title() + '\n\n')
+            f.write(_sentences(rng, rng.randint(3, 40)))
+    elif ext == 'csv':
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('id,name,amount\n')
+            for i in range(rng.randint(5, 200)):
+                f.write(f"{i},{rng.choice(WORDS)},{rng.randint(1, 10000)}\n")
+    elif ext == 'docx':
+        import docx
+        document = docx.Document()
+        for _ in range(rng.randint(2, 8)):
+            document.add_paragraph(_sentences(rng, 3))
+        document.save(path)
+    elif ext == 'pdf':
+        import fitz
+        document = fitz.open()
+        for _ in range(rng.randint(1, 4)):
+            page = document.new_page()
+            page.insert_text((72, 72), _sentences(rng, 2)[:90])
+        document.save(path)
+        document.close()
+    elif ext == 'xlsx':
+        import pandas as pd
+        rows = [{'name': rng.choice(WORDS), 'amount': rng.randint(1, 1000)} for _ in range(rng.randint(5, 50))]
+        pd.DataFrame(rows).to_excel(path, index=False)
+    elif ext == 'pptx':
+        from pptx import Presentation
+        presentation = Presentation()
+        for _ in range(rng.randint(1, 4)):
+            slide = presentation.slides.add_slide(presentation.slide_layouts[1])
+            slide.shapes.title.text = rng.choice(WORDS).title()
+            slide.placeholders[1].text = _sentences(rng, 1)
+        presentation.save(path)
+    elif ext in ('png', 'jpg', 'gif'):
+        from PIL import Image
+        size = (rng.randint(16, 256), rng.randint(16, 256))
+        image = Image.new('RGB', size, (rng.randint(0, 255), rng.randint(0, 255), rng.randint(0, 255)))
+        image.save(path)
+    else:
+        with open(path, 'wb') as f:
+            f.write(rng.randbytes(rng.randint(16, 4096)))
+
+
+def generate_corpus(root, num_files, mix=None, duplicate_ratio=0.05, max_depth=6, seed=0):
+    """Generate a reproducible synthetic directory tree and return the list of created files."""
+    rng = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    kinds = list(mix)
+    weights = [mix[k] for k in kinds]
+    os.makedirs(root, exist_ok=True)
+
+    created = []
+    base_time = datetime.datetime(2018, 1, 1).timestamp()
+    for i in range(num_files):
+        depth = rng.randint(0, max_depth)
+        dir_path = os.path.join(root, *[f"dir_{rng.randint(0, 4)}_{level}" for level in range(depth)])
+        os.makedirs(dir_path, exist_ok=True)
+
+        if created and rng.random() < duplicate_ratio:
+            source = rng.choice(created)
+            path = os.path.join(dir_path, f"copy_{i}_{os.path.basename(source)}")
+            shutil.copyfile(source, path)
+        else:
+            ext = rng.choices(kinds, weights)[0]
+            path = os.path.join(dir_path, f"{rng.choice(WORDS)}_{i}.{ext}")
+            _write_synthetic_file(path, ext, rng)
+
+        # Spread modification times over several years for date mode
+        mtime = base_time + rng.randint(0, 6 * 365 * 86400)
+        os.utime(path, (mtime, mtime))
+        created.append(path)
+    return created
+
+
+def peak_rss_kb():
+    """Return the peak resident set size of this process in kilobytes."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux reports kilobytes
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+class StageTimer:
+    """Accumulate wall-clock time per named stage."""
+
+    def __init__(self):
+        self.stages = {}
+
+    def run(self, name, func, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+        return result
+
+
+def run_mode(mode, input_path, output_path, inference):
+    """Run one organizing mode end to end and return its measurements.
+
+    peak_rss_kb is the peak of the whole process, so run_benchmark calls this
+    through run_mode_isolated to get a figure for the mode alone.
+    """
+    timer = StageTimer()
+    start = time.perf_counter()
+    file_paths = timer.run('walk', collect_file_paths, input_path)
+
+    if mode == 'content':
+        image_files, text_files = separate_files_by_type(file_paths)
+
+        def read_all():
+            tuples = []
+            for fp in text_files:
+                text_content = read_file_data(fp)
+                if text_content is not None:
+                    tuples.append((fp, text_content))
+            return tuples
+
+        text_tuples = timer.run('read', read_all)
+        data_images = timer.run('infer', process_image_files, image_files, inference, inference, silent=True)
+        data_texts = timer.run('infer', process_text_files, text_tuples, inference, silent=True)
+        operations = timer.run('plan', compute_operations, data_images + data_texts, output_path, set(), set())
+    elif mode == 'date':
+        operations = timer.run('plan', process_files_by_date, file_paths, output_path)
+    elif mode == 'type':
+        operations = timer.run('plan', process_files_by_type, file_paths, output_path)
+    else:
+        raise ValueError(f"Unknown mode: {mode}")
+
+    timer.run('execute', execute_operations, operations, dry_run=False, silent=True)
+    elapsed = time.perf_counter() - start
+
+    return {
+        'files': len(file_paths),
+        'operations': len(operations),
+        'seconds': elapsed,
+        'files_per_sec': len(file_paths) / elapsed if elapsed else None,
+        'peak_rss_kb': peak_rss_kb(),
+        'stages': timer.stages,
+    }
+
+
+def run_mode_isolated(mode, input_path, output_path, inference):
+    """Run a mode in a fresh child process so its peak RSS does not include earlier modes."""
+    # A spawned interpreter starts from scratch; a forked child would inherit the parent's footprint
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+        return executor.submit(run_mode, mode, input_path, output_path, inference).result()
+
+
+def run_benchmark(args):
+    """Generate (or reuse) a corpus, run every requested mode and append the results."""
+    workdir = tempfile.mkdtemp(prefix='organizer_bench_')
+    try:
+        corpus = args.corpus
+        if not corpus:
+            corpus = os.path.join(workdir, 'corpus')
+            start = time.perf_counter()
+            generate_corpus(corpus, args.files, parse_mix(args.mix) if args.mix else None,
+                            args.duplicates, args.depth, args.seed)
+            print(f"Generated {args.files} files in {time.perf_counter() - start:.2f} seconds")
+
+        if 'content' in args.modes:
+            import nltk
+            nltk.download('stopwords', quiet=True)
+            nltk.download('punkt', quiet=True)
+            nltk.download('wordnet', quiet=True)
+
+        inference = StubInference(latency=args.latency, token_latency=args.token_latency)
+        modes = {}
+        for mode in args.modes:
+            output_path = os.path.join(workdir, f"organized_{mode}")
+            modes[mode] = run_mode_isolated(mode, corpus, output_path, inference)
+            print(f"{mode:>8}: {modes[mode]['files']} files, {modes[mode]['seconds']:.2f} s, "
+                  f"{modes[mode]['files_per_sec'] or 0:.1f} files/s, "
+                  + ', '.join(f"{k}={v:.3f}s" for k, v in modes[mode]['stages'].items()))
+
+        record = {
+            'label': args.label,
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': sys.version.split()[0],
+            'platform': sys.platform,
+            'config': {
+                'files': args.files, 'mix': args.mix, 'duplicates': args.duplicates, 'depth': args.depth,
+                'seed': args.seed, 'latency': args.latency, 'token_latency': args.token_latency,
+                'corpus': args.corpus,
+            },
+            'modes': modes,
+        }
+        with open(args.output, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+        print(f"Results appended to {args.output}")
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+        else:
+            print(f"Benchmark files kept in {workdir}")
+
+
+def load_result(path, label=None):
+    """Load the last result (optionally with a given label) from a JSON-lines results file."""
+    selected = None
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if label is None or record.get('label') == label:
+                selected = record
+    if selected is None:
+        raise ValueError(f"No benchmark result found in {path}" + (f" with label {label!r}" if label else ''))
+    return selected
+
+
+def compare_results(baseline, current, threshold=0.15, min_seconds=0.05, stages=DEFAULT_GATED_STAGES):
+    """Compare two results and return a list of regression messages."""
+    regressions = []
+    for mode, current_mode in current['modes'].items():
+        baseline_mode = baseline['modes'].get(mode)
+        if baseline_mode is None:
+            continue
+        for stage in stages:
+            before = baseline_mode['stages'].get(stage)
+            after = current_mode['stages'].get(stage)
+            if before is None or after is None:
+                continue
+            change = (after - before) / before if before else 0.0
+            line = f"{mode}/{stage}: {before:.3f}s -> {after:.3f}s ({change:+.1%})"
+            print(line)
+            if after - before > min_seconds and change > threshold:
+                regressions.append(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the file organizer on synthetic corpora with a stub model.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    generate_parser = subparsers.add_parser('generate', help="Generate a synthetic corpus")
+    generate_parser.add_argument('path')
+
+    run_parser = subparsers.add_parser('run', help="Run the benchmark and append results")
+    run_parser.add_argument('--corpus', help="Use an existing directory instead of generating one")
+    run_parser.add_argument('--modes', type=lambda s: s.split(','), default=['date', 'type', 'content'])
+    run_parser.add_argument('--latency', type=float, default=0.0, help="Seconds of latency per model call")
+    run_parser.add_argument('--token-latency', type=float, default=0.0, help="Seconds of latency per generated word")
+    run_parser.add_argument('--output', default='bench_results.jsonl')
+    run_parser.add_argument('--label', default=None)
+    run_parser.add_argument('--keep', action='store_true', help="Keep the generated corpus and outputs")
+
+    for sub in (generate_parser, run_parser):
+        sub.add_argument('--files', type=int, default=500)
+        sub.add_argument('--mix', default=None, help="Comma separated ext=weight pairs, e.g. 'txt=30,png=10'")
+        sub.add_argument('--duplicates', type=float, default=0.05, help="Share of files that duplicate earlier ones")
+        sub.add_argument('--depth', type=int, default=6, help="Maximum nesting depth")
+        sub.add_argument('--seed', type=int, default=0)
+
+    compare_parser = subparsers.add_parser('compare', help="Compare two results and fail on regressions")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--baseline-label', default=None)
+    compare_parser.add_argument('--current-label', default=None)
+    compare_parser.add_argument('--threshold', type=float, default=0.15, help="Allowed relative slowdown per stage")
+    compare_parser.add_argument('--min-seconds', type=float, default=0.05, help="Ignore slowdowns below this many seconds")
+    compare_parser.add_argument('--stages', type=lambda s: s.split(','), default=list(DEFAULT_GATED_STAGES))
+
+    args = parser.parse_args()
+
+    if args.command == 'generate':
+        generate_corpus(args.path, args.files, parse_mix(args.mix) if args.mix else None,
+                        args.duplicates, args.depth, args.seed)
+        print(f"Generated {args.files} files in {args.path}")
+    elif args.command == 'run':
+        run_benchmark(args)
+    elif args.command == 'compare':
+        baseline = load_result(args.baseline, args.baseline_label)
+        current = load_result(args.current, args.current_label)
+        regressions = compare_results(baseline, current, args.threshold, args.min_seconds, args.stages)
+        if regressions:
+            print("Regressions detected:")
+            for line in regressions:
+                print("  " + line)
+            sys.exit(1)
+        print("No regressions detected.")
+
+
+if __name__ == '__main__':
+    main()
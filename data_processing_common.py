@@ -2,6 +2,18 @@ import os
 import re
 import datetime  # Import datetime for date operations
 from rich.progress import Progress, TextColumn, BarColumn, TimeElapsedColumn
+from log_writer import log_message, log_record
+
+# Archive extensions that must survive renaming as a whole
+COMPOUND_EXTENSIONS = ('.tar.gz', '.tar.bz2', '.tar.xz')
+
+def file_extension(file_path):
+    """Return the extension of a file, keeping compound archive extensions such as '.tar.gz' whole."""
+    lowered = file_path.lower()
+    for extension in COMPOUND_EXTENSIONS:
+        if lowered.endswith(extension):
+            return file_path[-len(extension):]
+    return os.path.splitext(file_path)[1]
 
 def sanitize_filename(name, max_length=50, max_words=5):
     """Sanitize the filename by removing unwanted words and characters."""
@@ -131,7 +143,7 @@ def compute_operations(data_list, new_path, renamed_files, processed_files):
 
         # Prepare folder name and file name
         folder_name = data['foldername']
-        new_file_name = data['filename'] + os.path.splitext(file_path)[1]
+        new_file_name = data['filename'] + file_extension(file_path)
 
         # Prepare new file path
         dir_path = os.path.join(new_path, folder_name)
@@ -141,7 +153,7 @@ def compute_operations(data_list, new_path, renamed_files, processed_files):
         counter = 1
         original_new_file_name = new_file_name
         while new_file_path in renamed_files:
-            new_file_name = f"{data['filename']}_{counter}" + os.path.splitext(file_path)[1]
+            new_file_name = f"{data['filename']}_{counter}" + file_extension(file_path)
             new_file_path = os.path.join(dir_path, new_file_name)
             counter += 1
 
@@ -161,44 +173,59 @@ def compute_operations(data_list, new_path, renamed_files, processed_files):
 
     return operations  # Return the list of operations for display or further processing
 
-def execute_operations(operations, dry_run=False, silent=False, log_file=None):
-    """Execute the file operations."""
-    total_operations = len(operations)
+def execute_operations(operations, dry_run=False, silent=False, log_file=None, manifest=None):
+    """Execute the file operations, recording created links in the run manifest if one is given.
 
-    with Progress(
-        TextColumn("[progress.description]{task.description}"),
-        BarColumn(),
-        TimeElapsedColumn(),
-        transient=True
-    ) as progress:
-        task = progress.add_task("Organizing Files...", total=total_operations)
-        for operation in operations:
-            source = operation['source']
-            destination = operation['destination']
-            link_type = operation['link_type']
-            dir_path = os.path.dirname(destination)
-
-            if dry_run:
-                message = f"Dry run: would create {link_type} from '{source}' to '{destination}'"
-            else:
-                # Ensure the directory exists before performing the operation
-                os.makedirs(dir_path, exist_ok=True)
-
-                try:
-                    if link_type == 'hardlink':
-                        os.link(source, destination)
+    If the run is interrupted or fails, everything it created is rolled back.
+    """
+    total_operations = len(operations)
+    # A failure only undoes the links made by this call, not earlier batches of the same run
+    checkpoint = manifest.checkpoint() if manifest is not None and not dry_run else 0
+
+    try:
+        with Progress(
+            TextColumn("[progress.description]{task.description}"),
+            BarColumn(),
+            TimeElapsedColumn(),
+            transient=True
+        ) as progress:
+            task = progress.add_task("Organizing Files...", total=total_operations)
+            for operation in operations:
+                source = operation['source']
+                destination = operation['destination']
+                link_type = operation['link_type']
+                dir_path = os.path.dirname(destination)
+
+                error = None
+                if dry_run:
+                    message = f"Dry run: would create {link_type} from '{source}' to '{destination}'"
+                else:
+                    # Ensure the directory exists before performing the operation
+                    os.makedirs(dir_path, exist_ok=True)
+
+                    try:
+                        if link_type == 'hardlink':
+                            os.link(source, destination)
+                        else:
+                            os.symlink(source, destination)
+                        message = f"Created {link_type} from '{source}' to '{destination}'"
+                    except Exception as e:
+                        error = str(e)
+                        message = f"Error creating {link_type} from '{source}' to '{destination}': {e}"
                     else:
-                        os.symlink(source, destination)
-                    message = f"Created {link_type} from '{source}' to '{destination}'"
-                except Exception as e:
-                    message = f"Error creating {link_type} from '{source}' to '{destination}': {e}"
-
-            progress.advance(task)
-
-            # Silent mode handling
-            if silent:
-                if log_file:
-                    with open(log_file, 'a') as f:
-                        f.write(message + '\n')
-            else:
-                print(message)
\ No newline at end of file
+                        if manifest is not None:
+                            manifest.record(source, destination, link_type)
+
+                progress.advance(task)
+
+                # Silent mode handling
+                if silent:
+                    log_message(log_file, message)
+                else:
+                    print(message)
+                log_record(log_file, event='link', source=source, destination=destination, link_type=link_type,
+                           dry_run=dry_run, error=error)
+    except BaseException:
+        if manifest is not None and not dry_run:
+            manifest.rollback(checkpoint)
+        raise
@@ -0,0 +1,287 @@
+import os
+import json
+import time
+import socket
+import sqlite3
+import hashlib
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_STORE_NAME = '.organizer_jobs.sqlite'
+SHARDS = 256
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    hash TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    shard INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, shard);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+RESULT_KEYS = ('foldername', 'filename', 'description', 'content', 'fallback')
+
+def content_hash(path):
+    """Hash the file contents, so identical files become a single job."""
+    with open(path, 'rb') as f:
+        return hashlib.file_digest(f, lambda: hashlib.blake2b(digest_size=16)).hexdigest()
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+class JobStore:
+    """SQLite queue of analysis jobs shared by a coordinator and its workers.
+
+    Jobs are keyed by content hash. Workers claim a few at a time under a lease;
+    a job whose lease runs out is handed to another worker, and a job that keeps
+    failing is given up after `max_attempts`. The store uses the rollback journal
+    rather than WAL because WAL needs shared memory, which does not work across
+    hosts; the file must live on storage with working file locks.
+    """
+
+    def __init__(self, path, timeout=60.0):
+        self.path = path
+        # Transactions are opened explicitly so claims can take the write lock up front
+        self._connection = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=DELETE")
+        self._connection.executescript(SCHEMA)
+
+    @contextmanager
+    def _transaction(self):
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield self._connection
+        except BaseException:
+            self._connection.execute("ROLLBACK")
+            raise
+        self._connection.execute("COMMIT")
+
+    def set_meta(self, key, value):
+        with self._transaction() as db:
+            db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def get_meta(self, key, default=None):
+        row = self._connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def enqueue(self, hashed_paths):
+        """Add (path, hash) pairs; files with already known contents share the existing job."""
+        with self._transaction() as db:
+            db.executemany("INSERT OR IGNORE INTO jobs (hash, path, shard) VALUES (?, ?, ?)",
+                           [(digest, path, int(digest[:2], 16) % SHARDS) for path, digest in hashed_paths])
+            db.executemany("INSERT OR REPLACE INTO files (path, hash) VALUES (?, ?)", hashed_paths)
+
+    def claim(self, worker, batch_size, lease, max_attempts, shard=None):
+        """Lease up to batch_size pending (or expired) jobs; returns (hash, path) pairs."""
+        now = time.time()
+        query = ("SELECT hash, path FROM jobs WHERE attempts < ? AND "
+                 "(status = 'pending' OR (status = 'leased' AND lease_until < ?))")
+        params = [max_attempts, now]
+        if shard is not None:
+            index, count = shard
+            query += " AND shard % ? = ?"
+            params += [count, index]
+        query += " LIMIT ?"
+        params.append(batch_size)
+        with self._transaction() as db:
+            jobs = db.execute(query, params).fetchall()
+            db.executemany(
+                "UPDATE jobs SET status = 'leased', worker = ?, lease_until = ?, attempts = attempts + 1 WHERE hash = ?",
+                [(worker, now + lease, digest) for digest, _ in jobs])
+        return jobs
+
+    def renew(self, worker, hashes, lease):
+        with self._transaction() as db:
+            db.executemany("UPDATE jobs SET lease_until = ? WHERE hash = ? AND worker = ? AND status = 'leased'",
+                           [(time.time() + lease, digest, worker) for digest in hashes])
+
+    def complete(self, results):
+        """Store results by hash; a result that arrives after its lease expired is still accepted."""
+        with self._transaction() as db:
+            db.executemany("UPDATE jobs SET status = 'done', result = ?, error = NULL WHERE hash = ? AND status != 'done'",
+                           [(json.dumps(result), digest) for digest, result in results.items()])
+
+    def fail(self, hashes, error, max_attempts, permanent=False):
+        """Record a failure; the job is retried unless it is permanent or out of attempts."""
+        with self._transaction() as db:
+            db.executemany(
+                "UPDATE jobs SET error = ?, lease_until = NULL, "
+                "status = CASE WHEN ? OR attempts >= ? THEN 'failed' ELSE 'pending' END "
+                "WHERE hash = ? AND status = 'leased'",
+                [(error, permanent, max_attempts, digest) for digest in hashes])
+
+    def release(self, worker, hashes):
+        """Return unfinished jobs to the queue without counting the attempt (worker shutdown)."""
+        with self._transaction() as db:
+            db.executemany("UPDATE jobs SET status = 'pending', lease_until = NULL, attempts = attempts - 1 "
+                           "WHERE hash = ? AND worker = ? AND status = 'leased'",
+                           [(digest, worker) for digest in hashes])
+
+    def counts(self):
+        """Return job counts by status."""
+        counts = {'pending': 0, 'leased': 0, 'done': 0, 'failed': 0}
+        for status, count in self._connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"):
+            counts[status] = count
+        return counts
+
+    def is_finished(self, max_attempts):
+        """True once every job is done or has used up its attempts and nothing more will be enqueued."""
+        if self.get_meta('enqueue_done') != '1':
+            return False
+        row = self._connection.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = 'pending' "
+            "OR (status = 'leased' AND (lease_until >= ? OR attempts < ?))", (time.time(), max_attempts)).fetchone()
+        return row[0] == 0
+
+    def results(self):
+        """Yield a metadata dict per file path whose contents were analyzed successfully."""
+        cursor = self._connection.execute(
+            "SELECT files.path, jobs.result FROM files JOIN jobs ON jobs.hash = files.hash WHERE jobs.status = 'done'")
+        for path, result in cursor:
+            data = json.loads(result)
+            data['file_path'] = path
+            yield data
+
+    def failures(self):
+        """Return (path, error) for jobs that were given up."""
+        return self._connection.execute(
+            "SELECT path, COALESCE(error, 'lease expired') FROM jobs WHERE status != 'done'").fetchall()
+
+    def close(self):
+        self._connection.close()
+
+class LeaseKeeper:
+    """Renew the leases of claimed jobs in the background while they are being processed."""
+
+    def __init__(self, store_path, worker, hashes, lease):
+        self.store_path = store_path
+        self.worker = worker
+        self.hashes = hashes
+        self.lease = lease
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        # SQLite connections cannot be shared across threads
+        store = JobStore(self.store_path)
+        try:
+            while not self._stop.wait(self.lease / 3):
+                store.renew(self.worker, self.hashes, self.lease)
+        finally:
+            store.close()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+
+def enqueue_files(store, file_paths, hash_workers=8, chunk_size=1000):
+    """Hash files in parallel and enqueue them in chunks, so workers can start early; returns unreadable paths."""
+    unreadable = []
+
+    def hash_one(path):
+        try:
+            return path, content_hash(path)
+        except OSError:
+            return path, None
+
+    with ThreadPoolExecutor(max_workers=hash_workers) as executor:
+        for start in range(0, len(file_paths), chunk_size):
+            chunk = []
+            for path, digest in executor.map(hash_one, file_paths[start:start + chunk_size]):
+                if digest is None:
+                    unreadable.append(path)
+                else:
+                    chunk.append((path, digest))
+            store.enqueue(chunk)
+    store.set_meta('enqueue_done', 1)
+    return unreadable
+
+def run_worker(store_path, analyze, worker=None, batch_size=4, lease=600.0, max_attempts=3, shard=None,
+               poll_interval=5.0):
+    """Claim and analyze jobs until the coordinator's queue is finished; returns the number of jobs completed.
+
+    `analyze(file_paths)` returns metadata dicts for the files it could read, as
+    analyze_files does; files missing from its result are failed permanently.
+    """
+    worker = worker or default_worker_id()
+    store = JobStore(store_path)
+    completed = 0
+    try:
+        while True:
+            jobs = store.claim(worker, batch_size, lease, max_attempts, shard)
+            if not jobs:
+                if store.is_finished(max_attempts):
+                    break
+                time.sleep(poll_interval)
+                continue
+
+            hashes = [digest for digest, _ in jobs]
+            errors = {}
+            try:
+                with LeaseKeeper(store_path, worker, hashes, lease):
+                    try:
+                        data_list = analyze([path for _, path in jobs])
+                    except Exception as e:
+                        if len(jobs) == 1:
+                            raise
+                        print(f"Worker {worker}: batch failed, retrying file by file: {e}")
+                        # Only the files that fail on their own are charged an attempt
+                        data_list = []
+                        for digest, path in jobs:
+                            try:
+                                data_list.extend(analyze([path]))
+                            except Exception as file_error:
+                                errors[digest] = str(file_error)
+            except KeyboardInterrupt:
+                store.release(worker, hashes)
+                raise
+            except Exception as e:
+                print(f"Worker {worker}: batch failed: {e}")
+                store.fail(hashes, str(e), max_attempts)
+                continue
+
+            by_path = {data['file_path']: data for data in data_list}
+            results = {}
+            unreadable = []
+            for digest, path in jobs:
+                data = by_path.get(path)
+                if digest in errors:
+                    store.fail([digest], errors[digest], max_attempts)
+                elif data is None:
+                    unreadable.append(digest)
+                else:
+                    results[digest] = {key: data.get(key) for key in RESULT_KEYS}
+            store.complete(results)
+            store.fail(unreadable, 'unsupported or unreadable', max_attempts, permanent=True)
+            completed += len(results)
+    finally:
+        store.close()
+    return completed
+
+def wait_for_jobs(store, max_attempts, poll_interval=5.0, on_progress=None):
+    """Block until every job is done or given up, reporting status counts along the way."""
+    while not store.is_finished(max_attempts):
+        if on_progress is not None:
+            on_progress(store.counts())
+        time.sleep(poll_interval)
+    if on_progress is not None:
+        on_progress(store.counts())
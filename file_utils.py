@@ -1,20 +1,136 @@
 import os
 import re
+import mmap
+import codecs
 import shutil
+import struct
+import tarfile
+import zipfile
+import posixpath
+from html.parser import HTMLParser
+from xml.etree import ElementTree
 from PIL import Image
 import pytesseract
 import fitz  # PyMuPDF
 import docx
 import pandas as pd  # Import pandas to read Excel and CSV files
 from pptx import Presentation  # Import Presentation for PPT files
+from tree_preview import render_tree
+
+# Characters of text handed to the model per file
+TEXT_READ_BUDGET = 3000
+
+# Share of the budget taken from the start of a large file; the rest is sampled further in
+HEAD_SHARE = 0.6
+SAMPLE_COUNT = 2
+
+# Archives are sampled, not unpacked: at most this many bytes are read from one member,
+# tars stop after ARCHIVE_SCAN_MEMBERS headers, and compressed tars (which must be read
+# sequentially) also stop before ARCHIVE_SCAN_BYTES of uncompressed data
+MEMBER_READ_BYTES = 64 * 1024
+ARCHIVE_SCAN_BYTES = 32 * 1024 * 1024
+ARCHIVE_SCAN_MEMBERS = 2000
+ARCHIVE_LISTING_ENTRIES = 30
+
+EBOOK_EXTENSIONS = ('.epub', '.mobi', '.azw', '.azw3')
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tgz', '.tar.gz', '.tar.bz2', '.tar.xz')
+ARCHIVE_TEXT_EXTENSIONS = ('.txt', '.md', '.rst', '.csv', '.json', '.xml', '.html', '.htm', '.xhtml')
+
+# Explicit byte orders, so regions sampled past the BOM decode the same way as the head.
+# UTF-32 comes first because its little-endian BOM starts with the UTF-16 one.
+BOMS = (
+    (codecs.BOM_UTF32_LE, 'utf-32-le'),
+    (codecs.BOM_UTF32_BE, 'utf-32-be'),
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF16_LE, 'utf-16-le'),
+    (codecs.BOM_UTF16_BE, 'utf-16-be'),
+)
+
+def bom_length(prefix):
+    """Return the number of byte order mark bytes at the start of the data."""
+    for bom, _ in BOMS:
+        if prefix.startswith(bom):
+            return len(bom)
+    return 0
+
+def detect_encoding(prefix):
+    """Guess the encoding of a file from the first few kilobytes."""
+    for bom, encoding in BOMS:
+        if prefix.startswith(bom):
+            return encoding
+    # UTF-16 without a BOM shows up as every other byte being NUL
+    if len(prefix) >= 4 and prefix[1::2].count(0) > len(prefix) // 4:
+        return 'utf-16-le'
+    if len(prefix) >= 4 and prefix[0::2].count(0) > len(prefix) // 4:
+        return 'utf-16-be'
+    # Allow a multi-byte character cut off at the end of the prefix
+    for cut in range(4):
+        try:
+            prefix[:len(prefix) - cut].decode('utf-8')
+            return 'utf-8'
+        except UnicodeDecodeError:
+            continue
+    return 'latin-1'
+
+def _char_width(encoding):
+    """Bytes per character used to align offsets and to size byte budgets."""
+    if encoding.startswith('utf-32'):
+        return 4
+    if encoding.startswith('utf-16'):
+        return 2
+    return 1
+
+def read_text_regions(file_path, max_chars=TEXT_READ_BUDGET):
+    """Read the head of a text file plus a few samples further in, without loading the whole file.
+
+    The file is memory-mapped and only the byte ranges within the budget are
+    decoded, so the cost does not depend on the file size. Samples start at a
+    line boundary and are separated from the head by '...' lines.
+    """
+    if os.path.getsize(file_path) == 0:
+        return ''
+    with open(file_path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        with memoryview(mapped) as view:
+            size = len(view)
+            prefix = bytes(view[:4096])
+            encoding = detect_encoding(prefix)
+            # Text starts after the BOM; sample offsets stay aligned to characters from there
+            offset = bom_length(prefix)
+            width = _char_width(encoding)
+            # UTF-8 text can take up to 4 bytes per character
+            bytes_per_char = 4 if width == 1 and encoding.startswith('utf-8') else width
+
+            if size - offset <= max_chars * bytes_per_char:
+                return str(view[offset:], encoding, 'ignore')[:max_chars]
+
+            head_chars = int(max_chars * HEAD_SHARE)
+            head = str(view[offset:offset + head_chars * bytes_per_char], encoding, 'ignore')[:head_chars]
+            parts = [head]
+
+            sample_chars = (max_chars - len(head)) // SAMPLE_COUNT
+            sample_bytes = sample_chars * bytes_per_char
+            for index in range(1, SAMPLE_COUNT + 1):
+                start = size * index // (SAMPLE_COUNT + 1)
+                # Begin at the next line so samples do not start mid-record
+                newline = mapped.find(b'\n', start, start + 1024)
+                if newline != -1:
+                    start = newline + 1
+                start -= (start - offset) % width
+                sample = str(view[start:start + sample_bytes], encoding, 'ignore')[:sample_chars]
+                if sample:
+                    parts.append(sample)
+            return '\n...\n'.join(parts)
 
 def read_text_file(file_path):
     """Read text content from a text file."""
-    max_chars = 3000  # Limit processing time
+    max_chars = TEXT_READ_BUDGET  # Limit processing time
     try:
-        with open(file_path, 'r', encoding='utf-8', errors='ignore') as file:
-            text = file.read(max_chars)
-        return text
+        try:
+            return read_text_regions(file_path, max_chars)
+        except (ValueError, OSError):
+            # Not mappable (e.g. a pipe or special file), read the head normally
+            with open(file_path, 'r', encoding='utf-8', errors='ignore') as file:
+                return file.read(max_chars)
     except Exception as e:
         print(f"Error reading text file {file_path}: {e}")
         return None
@@ -49,11 +165,12 @@ def read_spreadsheet_file(file_path):
     """Read text content from an Excel or CSV file."""
     try:
         if file_path.lower().endswith('.csv'):
-            df = pd.read_csv(file_path)
-        else:
-            df = pd.read_excel(file_path)
+            # CSV is plain text, so sample it directly instead of parsing it with pandas
+            return read_text_file(file_path)
+        # Only the first rows fit in the text budget anyway
+        df = pd.read_excel(file_path, nrows=100)
         text = df.to_string()
-        return text
+        return text[:TEXT_READ_BUDGET]
     except Exception as e:
         print(f"Error reading spreadsheet file {file_path}: {e}")
         return None
@@ -72,6 +189,257 @@ def read_ppt_file(file_path):
         print(f"Error reading PowerPoint file {file_path}: {e}")
         return None
 
+class _HTMLText(HTMLParser):
+    """Collect the visible text of (X)HTML fed to it in pieces, up to a character budget."""
+
+    SKIPPED_TAGS = ('script', 'style', 'head')
+    BLOCK_TAGS = ('p', 'div', 'br', 'li', 'tr', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'title')
+
+    def __init__(self, max_chars):
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self.length = 0
+        self.parts = []
+        self._skipping = 0
+
+    @property
+    def full(self):
+        return self.length >= self.max_chars
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIPPED_TAGS:
+            self._skipping += 1
+        elif tag in self.BLOCK_TAGS:
+            self.handle_data('\n')
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIPPED_TAGS and self._skipping:
+            self._skipping -= 1
+
+    def handle_data(self, data):
+        if self._skipping or self.full:
+            return
+        data = re.sub(r'[ \t\r\f\v]+', ' ', data)
+        if data.strip() or (data == '\n' and self.parts and self.parts[-1] != '\n'):
+            self.parts.append(data)
+            self.length += len(data)
+
+    def text(self):
+        return re.sub(r'\n\s*\n+', '\n', ''.join(self.parts)).strip()[:self.max_chars]
+
+def _read_html_member(stream, extractor, chunk_size=16 * 1024, max_bytes=MEMBER_READ_BYTES):
+    """Feed an (X)HTML member to the extractor chunk by chunk until it is full or max_bytes are read."""
+    decoder = codecs.getincrementaldecoder('utf-8')('ignore')
+    read = 0
+    while not extractor.full and read < max_bytes:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        read += len(chunk)
+        extractor.feed(decoder.decode(chunk))
+
+def _epub_spine(archive):
+    """Return the member names of an EPUB's reading order, from its container and package files."""
+    container = ElementTree.fromstring(archive.read('META-INF/container.xml'))
+    rootfile = next(element for element in container.iter() if element.tag.endswith('rootfile'))
+    package_path = rootfile.get('full-path')
+    package = ElementTree.fromstring(archive.read(package_path))
+    base = posixpath.dirname(package_path)
+    manifest = {element.get('id'): element.get('href') for element in package.iter() if element.tag.endswith('}item')}
+    return [posixpath.normpath(posixpath.join(base, manifest[item.get('idref')]))
+            for item in package.iter() if item.tag.endswith('itemref') and item.get('idref') in manifest]
+
+def read_epub_file(file_path):
+    """Read text from the first documents of an EPUB's spine, decompressing only what the budget needs."""
+    try:
+        with zipfile.ZipFile(file_path) as archive:
+            try:
+                names = _epub_spine(archive)
+            except (KeyError, StopIteration, ElementTree.ParseError):
+                # Malformed package file: fall back to the HTML members in archive order
+                names = [name for name in archive.namelist() if name.lower().endswith(('.xhtml', '.html', '.htm'))]
+            extractor = _HTMLText(TEXT_READ_BUDGET)
+            available = set(archive.namelist())
+            for name in names:
+                if extractor.full:
+                    break
+                if name in available:
+                    with archive.open(name) as member:
+                        _read_html_member(member, extractor)
+            extractor.close()
+            return extractor.text()
+    except Exception as e:
+        print(f"Error reading EPUB file {file_path}: {e}")
+        return None
+
+def palmdoc_decompress(data):
+    """Decompress one PalmDOC (LZ77 variant) text record."""
+    out = bytearray()
+    i = 0
+    while i < len(data):
+        c = data[i]
+        i += 1
+        if c == 0 or 0x09 <= c <= 0x7F:
+            out.append(c)
+        elif c <= 0x08:
+            out += data[i:i + c]
+            i += c
+        elif c >= 0xC0:
+            out += b' ' + bytes([c ^ 0x80])
+        else:
+            if i >= len(data):
+                break
+            pair = (c << 8) | data[i]
+            i += 1
+            distance = (pair >> 3) & 0x7FF
+            if distance == 0 or distance > len(out):
+                break  # Corrupt record
+            for _ in range((pair & 0x07) + 3):
+                out.append(out[-distance])
+    return bytes(out)
+
+def _trailing_entries_size(record, extra_flags):
+    """Size of the trailing entries MOBI appends to each text record."""
+    size = 0
+    flags = extra_flags >> 1
+    while flags:
+        if flags & 1:
+            # Backward-encoded variable-width integer at the current end of the record
+            value = 0
+            for byte in record[max(0, len(record) - size - 4):len(record) - size]:
+                if byte & 0x80:
+                    value = 0
+                value = (value << 7) | (byte & 0x7F)
+            size += value
+        flags >>= 1
+    if extra_flags & 1 and len(record) > size:
+        size += (record[len(record) - size - 1] & 0x03) + 1
+    return size
+
+def read_mobi_file(file_path, max_records=32):
+    """Read the first text records of a MOBI/AZW book, seeking to each record instead of loading the file."""
+    try:
+        with open(file_path, 'rb') as f:
+            header = f.read(78)
+            if len(header) < 78 or header[60:68] not in (b'BOOKMOBI', b'TEXtREAd'):
+                return None
+            record_count = struct.unpack('>H', header[76:78])[0]
+            offsets = [struct.unpack('>I', f.read(8)[:4])[0] for _ in range(record_count)]
+            file_size = os.fstat(f.fileno()).st_size
+            offsets.append(file_size)
+
+            f.seek(offsets[0])
+            record0 = f.read(offsets[1] - offsets[0])
+            # PalmDOC header: compression, unused, text length, text record count, record size, encryption
+            compression, _, _, text_records, _, encryption = struct.unpack('>HHIHHH', record0[:14])
+            if encryption != 0 or compression not in (1, 2):
+                # DRM-protected, or HUFF/CDIC compressed (rare, and not worth a full decoder here)
+                return None
+
+            encoding, extra_flags = 'cp1252', 0
+            if record0[16:20] == b'MOBI':
+                mobi_length = struct.unpack('>I', record0[20:24])[0]
+                text_encoding = struct.unpack('>I', record0[28:32])[0]
+                encoding = 'utf-8' if text_encoding == 65001 else 'cp1252'
+                if mobi_length >= 0xE4 and len(record0) >= 0xF4:
+                    extra_flags = struct.unpack('>H', record0[0xF2:0xF4])[0]
+
+            extractor = _HTMLText(TEXT_READ_BUDGET)
+            decoder = codecs.getincrementaldecoder(encoding)('ignore')
+            for index in range(1, min(text_records, max_records, record_count - 1) + 1):
+                f.seek(offsets[index])
+                record = f.read(offsets[index + 1] - offsets[index])
+                record = record[:len(record) - _trailing_entries_size(record, extra_flags)]
+                text = palmdoc_decompress(record) if compression == 2 else record
+                extractor.feed(decoder.decode(text))
+                if extractor.full:
+                    break
+            extractor.close()
+            return extractor.text()
+    except Exception as e:
+        print(f"Error reading e-book file {file_path}: {e}")
+        return None
+
+def _member_text(data, name, max_chars):
+    text = str(data[bom_length(data):], detect_encoding(data[:4096]), 'ignore')
+    if name.lower().endswith(('.html', '.htm', '.xhtml')):
+        extractor = _HTMLText(max_chars)
+        extractor.feed(text)
+        extractor.close()
+        return extractor.text()
+    return text[:max_chars]
+
+def _archive_summary(kind, names, excerpts, complete=True):
+    """Describe an archive by its member listing and the text sampled from its members."""
+    listing = '\n'.join(names[:ARCHIVE_LISTING_ENTRIES])
+    if len(names) > ARCHIVE_LISTING_ENTRIES:
+        more = len(names) - ARCHIVE_LISTING_ENTRIES
+        listing += f"\n... ({more if complete else f'at least {more}'} more)"
+    total = len(names) if complete else f"at least {len(names)}"
+    text = f"{kind} archive with {total} files:\n{listing}"
+    for name, excerpt in excerpts:
+        text += f"\n\n--- {name} ---\n{excerpt}"
+    return text[:TEXT_READ_BUDGET]
+
+def read_zip_archive(file_path):
+    """Sample a zip archive: its member listing plus the head of its first text members."""
+    try:
+        with zipfile.ZipFile(file_path) as archive:
+            members = [info for info in archive.infolist() if not info.is_dir()]
+            remaining = TEXT_READ_BUDGET - 60 * min(len(members), ARCHIVE_LISTING_ENTRIES)
+            excerpts = []
+            for info in members:
+                if remaining <= 0:
+                    break
+                if not info.filename.lower().endswith(ARCHIVE_TEXT_EXTENSIONS) or info.flag_bits & 0x1:
+                    continue  # Not text, or encrypted
+                with archive.open(info) as member:
+                    excerpt = _member_text(member.read(min(MEMBER_READ_BYTES, remaining * 4)), info.filename, remaining)
+                if excerpt.strip():
+                    excerpts.append((info.filename, excerpt))
+                    remaining -= len(excerpt)
+            return _archive_summary('Zip', [info.filename for info in members], excerpts)
+    except Exception as e:
+        print(f"Error reading zip archive {file_path}: {e}")
+        return None
+
+def read_tar_archive(file_path):
+    """Sample a tar archive, stopping once the text budget is spent or the scan limit is reached.
+
+    Plain tars are opened seekable, so members that are not read are skipped with
+    a seek. Compressed tars can only be read as a stream, where moving to the next
+    header decompresses the whole previous member, so the scan stops before the
+    uncompressed stream position would pass ARCHIVE_SCAN_BYTES. Either way at most
+    ARCHIVE_SCAN_MEMBERS headers are read, since tarfile keeps every one in memory.
+    """
+    streaming = not file_path.lower().endswith('.tar')
+    try:
+        with tarfile.open(file_path, mode='r|*' if streaming else 'r:') as archive:
+            names = []
+            excerpts = []
+            remaining = TEXT_READ_BUDGET - 60 * ARCHIVE_LISTING_ENTRIES
+            complete = True
+            for count, member in enumerate(archive, 1):
+                if member.isfile():
+                    names.append(member.name)
+                    if remaining > 0 and member.name.lower().endswith(ARCHIVE_TEXT_EXTENSIONS):
+                        stream = archive.extractfile(member)
+                        excerpt = _member_text(stream.read(min(MEMBER_READ_BYTES, remaining * 4)), member.name, remaining)
+                        if excerpt.strip():
+                            excerpts.append((member.name, excerpt))
+                            remaining -= len(excerpt)
+                if (remaining <= 0 and len(names) >= ARCHIVE_LISTING_ENTRIES) or count >= ARCHIVE_SCAN_MEMBERS:
+                    complete = False
+                    break
+                # Advancing past this member would read (and decompress) all of it
+                if streaming and member.offset_data + member.size > ARCHIVE_SCAN_BYTES:
+                    complete = False
+                    break
+            return _archive_summary('Tar', names, excerpts, complete)
+    except Exception as e:
+        print(f"Error reading tar archive {file_path}: {e}")
+        return None
+
 def read_file_data(file_path):
     """Read content from a file based on its extension."""
     ext = os.path.splitext(file_path.lower())[1]
@@ -85,25 +453,40 @@ def read_file_data(file_path):
         return read_spreadsheet_file(file_path)
     elif ext in ['.ppt', '.pptx']:
         return read_ppt_file(file_path)
+    elif ext == '.epub':
+        return read_epub_file(file_path)
+    elif ext in ['.mobi', '.azw', '.azw3']:
+        return read_mobi_file(file_path)
+    elif ext == '.zip':
+        return read_zip_archive(file_path)
+    elif file_path.lower().endswith(ARCHIVE_EXTENSIONS):
+        return read_tar_archive(file_path)
     else:
         return None  # Unsupported file type
 
-def display_directory_tree(path):
-    """Display the directory tree in a format similar to the 'tree' command, including the full path."""
-    def tree(dir_path, prefix=''):
-        contents = sorted([c for c in os.listdir(dir_path) if not c.startswith('.')])
-        pointers = ['├── '] * (len(contents) - 1) + ['└── '] if contents else []
-        for pointer, name in zip(pointers, contents):
-            full_path = os.path.join(dir_path, name)
-            print(prefix + pointer + name)
-            if os.path.isdir(full_path):
-                extension = '│   ' if pointer == '├── ' else '    '
-                tree(full_path, prefix + extension)
-    if os.path.isdir(path):
-        print(os.path.abspath(path))
-        tree(path)
-    else:
-        print(os.path.abspath(path))
+def display_directory_tree(path, max_depth=3, max_entries=20):
+    """Display the directory tree in a format similar to the 'tree' command, including the full path.
+
+    The walk is iterative and limited to `max_depth` levels and `max_entries` entries
+    per directory, with the rest summarized as '… N more'.
+    """
+    print(os.path.abspath(path))
+    if not os.path.isdir(path):
+        return
+
+    def list_children(dir_path, depth):
+        try:
+            with os.scandir(dir_path) as entries:
+                contents = sorted((e.name, e.is_dir(follow_symlinks=False)) for e in entries if not e.name.startswith('.'))
+        except OSError:
+            return [], 0
+        # Directories that are not expanded are marked with a trailing slash
+        at_limit = depth + 1 >= max_depth
+        shown = [(name + ('/' if is_dir and at_limit else ''), os.path.join(dir_path, name) if is_dir else None)
+                 for name, is_dir in contents[:max_entries]]
+        return shown, len(contents) - len(shown)
+
+    render_tree(path, list_children, max_depth)
 
 def collect_file_paths(base_path):
     """Collect all file paths from the base directory or single file, excluding hidden files."""
@@ -113,17 +496,20 @@ def collect_file_paths(base_path):
         file_paths = []
         for root, _, files in os.walk(base_path):
             for file in files:
-                if not file.startswith('.'):  # Exclude hidden files
+                # Exclude hidden files. The organizer's own state in an output folder (run
+                # manifest, search index, job store) uses dot-names so that it is skipped
+                # here and in the directory previews.
+                if not file.startswith('.'):
                     file_paths.append(os.path.join(root, file))
         return file_paths
 
 def separate_files_by_type(file_paths):
     """Separate files into images and text files based on their extensions."""
     image_extensions = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tiff')
-    text_extensions = ('.txt', '.docx', '.doc', '.pdf', '.md', '.xls', '.xlsx', '.ppt', '.pptx', '.csv')
+    text_extensions = ('.txt', '.docx', '.doc', '.pdf', '.md', '.xls', '.xlsx', '.ppt', '.pptx', '.csv') + EBOOK_EXTENSIONS
     image_files = [fp for fp in file_paths if os.path.splitext(fp.lower())[1] in image_extensions]
-    text_files = [fp for fp in file_paths if os.path.splitext(fp.lower())[1] in text_extensions]
+    # Archives are described by their listing and sampled text members
+    text_files = [fp for fp in file_paths
+                  if os.path.splitext(fp.lower())[1] in text_extensions or fp.lower().endswith(ARCHIVE_EXTENSIONS)]
 
     return image_files, text_files  # Return only two values
-
-# TODO:ebook: '.mobi', '.azw', '.azw3', '.epub',
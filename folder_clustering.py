@@ -0,0 +1,129 @@
+import re
+import zlib
+import math
+from collections import Counter
+import numpy as np
+from nltk.corpus import stopwords
+from data_processing_common import sanitize_filename
+from generation import generate_short_answer
+
+TOKEN_PATTERN = re.compile(r'[a-zA-Z]{3,}')
+
+# Words that show up in almost every generated description and say nothing about the topic
+DESCRIPTION_NOISE = {
+    'image', 'picture', 'photo', 'document', 'text', 'file', 'shows', 'depicts', 'features', 'describes',
+    'discusses', 'provides', 'includes', 'presents', 'summary', 'main', 'details', 'various', 'also',
+}
+
+def tokenize_description(text, stop_words):
+    """Split a description into lowercase content words."""
+    return [word for word in (w.lower() for w in TOKEN_PATTERN.findall(text or ''))
+            if word not in stop_words and word not in DESCRIPTION_NOISE]
+
+def hashed_tfidf(token_lists, dim=512):
+    """Embed token lists as L2-normalized hashed TF-IDF vectors (signed feature hashing)."""
+    matrix = np.zeros((len(token_lists), dim), dtype=np.float32)
+    for row, tokens in enumerate(token_lists):
+        for token, count in Counter(tokens).items():
+            h = zlib.crc32(token.encode('utf-8'))
+            sign = 1.0 if h & 0x80000000 else -1.0
+            matrix[row, h % dim] += sign * (1.0 + math.log(count))
+
+    # Inverse document frequency per hashed column
+    df = np.count_nonzero(matrix, axis=0)
+    idf = np.log((1.0 + len(token_lists)) / (1.0 + df)) + 1.0
+    matrix *= idf.astype(np.float32)
+
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def spherical_kmeans(matrix, k, iterations=25, seed=0, chunk_size=8192):
+    """Cluster unit vectors by cosine similarity; returns (labels, centroids)."""
+    rng = np.random.default_rng(seed)
+    n = matrix.shape[0]
+
+    # k-means++ initialisation on cosine distance
+    centroids = np.empty((k, matrix.shape[1]), dtype=np.float32)
+    centroids[0] = matrix[rng.integers(n)]
+    closest = 1.0 - matrix @ centroids[0]
+    for i in range(1, k):
+        weights = np.clip(closest, 0, None).astype(np.float64) ** 2
+        total = weights.sum()
+        index = rng.choice(n, p=weights / total) if total > 0 else rng.integers(n)
+        centroids[i] = matrix[index]
+        closest = np.minimum(closest, 1.0 - matrix @ centroids[i])
+
+    labels = np.full(n, -1, dtype=np.int64)
+    for _ in range(iterations):
+        new_labels = np.empty(n, dtype=np.int64)
+        for start in range(0, n, chunk_size):
+            new_labels[start:start + chunk_size] = np.argmax(matrix[start:start + chunk_size] @ centroids.T, axis=1)
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, matrix)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        empty = norms[:, 0] == 0
+        # Keep the old centroid for clusters that lost all their members
+        centroids = np.where(empty[:, None], centroids, sums / np.where(norms == 0, 1.0, norms))
+    return labels, centroids
+
+def choose_cluster_count(n, max_clusters=40):
+    """Pick a cluster count that grows slowly with the number of files."""
+    return max(1, min(max_clusters, n, int(round(math.sqrt(n / 2)))))
+
+def name_cluster(descriptions, keywords, text_inference):
+    """Ask the text model for one folder name covering a group of related files."""
+    listed = '\n'.join(f"- {d[:300]}" for d in descriptions)
+    prompt = f"""The descriptions below belong to files that will be stored in the same folder.
+Generate a general category or theme that best represents all of them. This will be used as the folder name.
+Limit the category to a maximum of 2 words. Use nouns and avoid verbs.
+Do not include any generic terms like 'untitled', 'unknown', 'files' or 'documents'.
+
+Descriptions:
+{listed}
+
+Frequent keywords: {', '.join(keywords)}
+
+Output only the category, without any additional text.
+
+Category:"""
+    category = generate_short_answer(text_inference, prompt, 'Category')
+    return sanitize_filename(category, max_words=2)
+
+def consolidate_folders(data_list, text_inference, max_clusters=40, samples_per_cluster=5):
+    """Assign shared folder names to files with similar descriptions.
+
+    Descriptions are embedded locally, clustered, and each cluster is named with a
+    single model call, so K folder-name completions replace one per file.
+    """
+    if not data_list:
+        return data_list
+
+    stop_words = set(stopwords.words('english'))
+    token_lists = [tokenize_description(data['description'], stop_words) for data in data_list]
+    matrix = hashed_tfidf(token_lists)
+    k = choose_cluster_count(len(data_list), max_clusters)
+    labels, centroids = spherical_kmeans(matrix, k)
+
+    for cluster in range(k):
+        members = np.flatnonzero(labels == cluster)
+        if members.size == 0:
+            continue
+
+        # Most representative descriptions are the ones closest to the centroid
+        scores = matrix[members] @ centroids[cluster]
+        representatives = members[np.argsort(-scores)[:samples_per_cluster]]
+        counts = Counter(token for index in members for token in set(token_lists[index]))
+        keywords = [word for word, _ in counts.most_common(8)]
+
+        name = name_cluster([data_list[i]['description'] for i in representatives], keywords, text_inference)
+        if not name or name == 'untitled':
+            name = sanitize_filename('_'.join(keywords[:2]), max_words=2) if keywords else 'miscellaneous'
+        # Two clusters that end up with the same name are simply merged into one folder
+        for index in members:
+            data_list[index]['foldername'] = name
+    return data_list
@@ -0,0 +1,162 @@
+import re
+import time
+import statistics
+from collections import deque
+from contextvars import ContextVar
+
+# Per-call generation limits. Filenames and categories are a few words on one line;
+# summaries and image descriptions are capped at roughly 150 words.
+SHORT_ANSWER_MAX_TOKENS = 16
+SUMMARY_MAX_TOKENS = 200
+DESCRIPTION_MAX_TOKENS = 200
+
+# Truncated input used when the first attempt at a file runs out of time
+TRUNCATED_INPUT_CHARS = 600
+TRUNCATED_DESCRIPTION_MAX_TOKENS = 60
+
+# Degradation ladder, in order: retried with truncated input, named from the
+# description without the model, or placed in others/ under its own name
+FALLBACK_RUNGS = ('truncated', 'description', 'others')
+
+_active_deadline = ContextVar('active_deadline', default=None)
+
+class GenerationTimeout(Exception):
+    """Raised when the deadline of the current file passes during generation."""
+
+class Deadline:
+    """Wall-clock budget shared by every model call made while it is active.
+
+    Streams are checked between tokens and closed as soon as the budget runs out;
+    once expired, any further call fails immediately, so a slow file cannot start
+    new generations either. Prompt evaluation before the first token cannot be
+    interrupted, which is why inputs are bounded when they are read.
+    """
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires = time.monotonic() + seconds
+        self.expired = False
+        self._token = None
+
+    def check(self):
+        if time.monotonic() >= self.expires:
+            self.expired = True
+            raise GenerationTimeout(f"Generation exceeded {self.seconds:.0f}s budget")
+
+    def __enter__(self):
+        self._token = _active_deadline.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _active_deadline.reset(self._token)
+
+def check_deadline():
+    """Raise GenerationTimeout if the active deadline, if any, has passed."""
+    deadline = _active_deadline.get()
+    if deadline is not None:
+        deadline.check()
+
+class LatencyBudget:
+    """Per-file time budget that follows how long files of one kind usually take here.
+
+    Until enough files have been timed the initial budget applies; after that the
+    budget is a multiple of the median latency, clamped to [minimum, maximum].
+    """
+
+    def __init__(self, initial=120.0, multiplier=5.0, minimum=20.0, maximum=300.0, window=50):
+        self.initial = initial
+        self.multiplier = multiplier
+        self.minimum = minimum
+        self.maximum = maximum
+        self._samples = deque(maxlen=window)
+
+    def seconds(self):
+        if len(self._samples) < 5:
+            return self.initial
+        return min(self.maximum, max(self.minimum, self.multiplier * statistics.median(self._samples)))
+
+    def record(self, seconds):
+        self._samples.append(seconds)
+
+def generate_within_budget(generate, retry, budget):
+    """Walk the degradation ladder for one file; returns (metadata or None, rung used or None).
+
+    generate() runs under the adaptive budget and retry(), the same work on
+    truncated input, under half of it, so no file takes more than 1.5 budgets.
+    When naming runs out of time after the description exists, the metadata
+    functions name the file from the description and the rung is 'description'.
+    If both attempts time out, None is returned and the caller uses others/.
+    """
+    seconds = budget.seconds()
+    start_time = time.monotonic()
+    for attempt, limit, rung in ((generate, seconds, None), (retry, seconds / 2, 'truncated')):
+        try:
+            with Deadline(limit) as deadline:
+                metadata = attempt()
+        except GenerationTimeout:
+            continue
+        if deadline.expired:
+            return metadata, 'description'
+        if rung is None:
+            budget.record(time.monotonic() - start_time)
+        return metadata, rung
+    return None, 'others'
+
+def fallback_report(data_list):
+    """Describe which files went down which rung of the degradation ladder, or return None."""
+    lines = []
+    for rung in FALLBACK_RUNGS:
+        paths = [data['file_path'] for data in data_list if data.get('fallback') == rung]
+        if paths:
+            lines.append(f"Fallback '{rung}' ({len(paths)} file(s)):")
+            lines.extend(f"  {path}" for path in paths)
+    return '\n'.join(lines) if lines else None
+
+def first_line_complete(text):
+    """Return True once a non-empty first line has been terminated by a newline."""
+    stripped = text.lstrip()
+    return bool(stripped) and '\n' in stripped
+
+def collect_stream(chunks, extract, is_complete=None, max_pieces=None):
+    """Concatenate streamed pieces, stopping early once the answer is complete.
+
+    Closing the stream on early exit cancels the remaining generation in
+    llama.cpp, so no decode time is spent on text that would be thrown away.
+    The same happens when the active Deadline passes, which raises GenerationTimeout.
+    """
+    pieces = []
+    deadline = _active_deadline.get()
+    try:
+        for chunk in chunks:
+            if deadline is not None:
+                deadline.check()
+            piece = extract(chunk)
+            if not piece:
+                continue
+            pieces.append(piece)
+            if max_pieces is not None and len(pieces) >= max_pieces:
+                break
+            if is_complete is not None and '\n' in piece and is_complete(''.join(pieces)):
+                break
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+    return ''.join(pieces)
+
+def _completion_text(chunk):
+    choices = chunk.get('choices', [])
+    return choices[0].get('text', '') if choices else ''
+
+def stream_completion(text_inference, prompt, max_tokens, is_complete=None):
+    """Run a streamed completion with a token limit and return the generated text."""
+    check_deadline()
+    chunks = text_inference.create_completion(prompt, max_tokens=max_tokens, stream=True)
+    return collect_stream(chunks, _completion_text, is_complete)
+
+def generate_short_answer(text_inference, prompt, label):
+    """Generate a one-line answer (filename or category) and strip a leading 'Label:'."""
+    text = stream_completion(text_inference, prompt, SHORT_ANSWER_MAX_TOKENS, first_line_complete)
+    text = text.strip()
+    text = text.splitlines()[0] if text else ''
+    return re.sub(rf'^{label}:\s*', '', text, flags=re.IGNORECASE).strip()
@@ -0,0 +1,229 @@
+import os
+import json
+import time
+import platform
+import tomllib
+
+# Calibration results and user overrides live outside the repository
+CONFIG_DIR = os.path.join(os.path.expanduser('~'), '.local_file_organizer')
+CALIBRATION_FILE = os.path.join(CONFIG_DIR, 'calibration.json')
+CONFIG_FILE = os.path.join(CONFIG_DIR, 'config.toml')  # Override with ORGANIZER_CONFIG
+
+PROFILE_KEYS = ('image_model', 'text_model', 'n_ctx', 'n_threads', 'n_batch')
+GIB = 1024 ** 3
+
+# Model variants by memory tier. The text model shares RAM with the 7B vision
+# model, so the medium tier keeps the project's original pair. The kernel reports
+# less than the installed RAM (firmware and kernel reservations), so the
+# thresholds leave headroom: a 16 GB machine shows about 15.5 GiB, an 8 GB one 7.6.
+TIERS = [
+    # (minimum visible RAM in GiB, settings)
+    (14.5, {'image_model': 'llava-v1.6-vicuna-7b:q4_0', 'text_model': 'Llama3.2-3B-Instruct:q4_K_M', 'n_ctx': 4096, 'n_batch': 512}),
+    (7, {'image_model': 'llava-v1.6-vicuna-7b:q4_0', 'text_model': 'Llama3.2-3B-Instruct:q3_K_M', 'n_ctx': 2048, 'n_batch': 512}),
+    (0, {'image_model': 'llava-phi-3-mini:q4_0', 'text_model': 'Llama3.2-1B-Instruct:q4_K_M', 'n_ctx': 2048, 'n_batch': 256}),
+]
+
+# k-quant kernels rely on AVX2 on x86; without it the plain q4_0 layout is faster
+NO_AVX2_TEXT_MODELS = {
+    'Llama3.2-3B-Instruct:q4_K_M': 'Llama3.2-3B-Instruct:q4_0',
+    'Llama3.2-3B-Instruct:q3_K_M': 'Llama3.2-3B-Instruct:q4_0',
+    'Llama3.2-1B-Instruct:q4_K_M': 'Llama3.2-1B-Instruct:q4_0',
+}
+
+# Alternatives calibration may pick for the tier's text model, and batch sizes to try
+QUANTIZATIONS = ('q4_K_M', 'q3_K_M', 'q4_0')
+BATCH_SIZES = (128, 256, 512)
+
+# Long enough that prompt evaluation, which the batch size affects, is part of the measurement
+CALIBRATION_PROMPT = ("Summarize the following text.\n\n" + (
+    "The quarterly report covers revenue, operating costs and staffing across the three regional offices. "
+    "Sales grew in the northern region while maintenance expenses rose after the warehouse move. ") * 12
+    + "\nSummary:")
+
+class HardwareInfo:
+    """CPU and memory facts that decide which profile fits this machine."""
+
+    def __init__(self):
+        self.logical_cores = os.cpu_count() or 1
+        self.physical_cores = self.logical_cores
+        self.flags = set()
+        self.machine = platform.machine().lower()
+        self._read_cpuinfo()
+        self.ram_bytes = self._read_ram()
+
+    def _read_cpuinfo(self):
+        try:
+            with open('/proc/cpuinfo', encoding='utf-8', errors='replace') as f:
+                cpuinfo = f.read()
+        except OSError:
+            return
+        cores = set()
+        physical_id = None
+        for line in cpuinfo.splitlines():
+            key, _, value = line.partition(':')
+            key = key.strip()
+            if key == 'flags' and not self.flags:
+                self.flags = set(value.split())
+            elif key == 'physical id':
+                physical_id = value.strip()
+            elif key == 'core id':
+                cores.add((physical_id, value.strip()))
+        if cores:
+            self.physical_cores = len(cores)
+
+    @staticmethod
+    def _read_ram():
+        try:
+            return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+        except (AttributeError, ValueError, OSError):
+            return None  # Not available on Windows
+
+    @property
+    def avx2(self):
+        """True or False on x86 when known, None elsewhere (ARM has its own SIMD kernels)."""
+        if self.machine not in ('x86_64', 'amd64', 'i386', 'i686') or not self.flags:
+            return None
+        return 'avx2' in self.flags
+
+    def signature(self):
+        """Identify the machine so calibration is redone after a hardware change."""
+        return f"{self.machine}/{self.physical_cores}c/{self.logical_cores}t/{(self.ram_bytes or 0) // GIB}g"
+
+    def describe(self):
+        ram = f"{self.ram_bytes / GIB:.1f} GiB RAM" if self.ram_bytes else "unknown RAM"
+        avx = {True: 'AVX2', False: 'no AVX2', None: 'AVX2 n/a'}[self.avx2]
+        return f"{self.physical_cores} cores / {self.logical_cores} threads, {ram}, {avx}"
+
+def detect_profile(hardware=None):
+    """Pick model variants and llama.cpp settings from the hardware alone."""
+    hardware = hardware or HardwareInfo()
+    ram_gib = hardware.ram_bytes / GIB if hardware.ram_bytes else 8
+    profile = next(dict(settings) for minimum, settings in TIERS if ram_gib >= minimum)
+    if hardware.avx2 is False:
+        profile['text_model'] = NO_AVX2_TEXT_MODELS.get(profile['text_model'], profile['text_model'])
+    # Hyper-threads share execution units, so matrix kernels scale with physical cores
+    profile['n_threads'] = max(1, hardware.physical_cores)
+    return profile
+
+def _load_calibration(hardware):
+    try:
+        with open(CALIBRATION_FILE, encoding='utf-8') as f:
+            calibration = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if calibration.get('signature') != hardware.signature():
+        return {}
+    settings = {key: calibration[key] for key in PROFILE_KEYS if key in calibration}
+    # Calibration may only pick another quantization of the tier's text model, never another size
+    tier_model = detect_profile(hardware)['text_model'].partition(':')[0]
+    if settings.get('text_model', '').partition(':')[0] != tier_model:
+        settings.pop('text_model', None)
+    return settings
+
+def _load_config():
+    path = os.environ.get('ORGANIZER_CONFIG') or CONFIG_FILE
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'rb') as f:
+            document = tomllib.load(f)
+    except (OSError, tomllib.TOMLDecodeError) as e:
+        print(f"Error loading config file {path}: {e}")
+        return {}
+    settings = document.get('profile', document)
+    return {key: settings[key] for key in PROFILE_KEYS if key in settings}
+
+def select_profile(hardware=None):
+    """Return the profile to run with: detected, then calibrated, then config file overrides."""
+    hardware = hardware or HardwareInfo()
+    profile = detect_profile(hardware)
+    profile.update(_load_calibration(hardware))
+    profile.update(_load_config())
+    return profile
+
+def apply_runtime_settings(inference, profile):
+    """Set the thread count and batch size on an already loaded llama.cpp model, where supported."""
+    llama = getattr(inference, 'model', None)
+    if llama is None:
+        return
+    n_batch = getattr(llama, 'n_batch', None)
+    if n_batch is not None:
+        # The batch buffer is allocated at load time, so it can only shrink
+        llama.n_batch = min(n_batch, profile['n_batch'])
+    context = getattr(getattr(llama, '_ctx', None), 'ctx', None)
+    if context is None:
+        return
+    try:
+        from nexa.gguf.llama import llama_cpp
+        llama_cpp.llama_set_n_threads(context, profile['n_threads'], profile['n_threads'])
+    except (ImportError, AttributeError):
+        pass
+
+def _quantization_variants(model, avx2):
+    """The tier's model in each quantization worth trying on this CPU, starting with the model itself."""
+    name, _, quantization = model.partition(':')
+    # k-quants are slow without AVX2, so only the plain layout is tried there
+    options = ('q4_0',) if avx2 is False else QUANTIZATIONS
+    return [model] + [f"{name}:{option}" for option in options if option != quantization]
+
+def _measure_tokens_per_second(text_inference, max_tokens, run=0):
+    """Time one request, including the prompt evaluation that the batch size affects."""
+    # A distinct opening line keeps llama.cpp from reusing the previous prompt's KV cache
+    prompt = f"Calibration run {run}.\n" + CALIBRATION_PROMPT
+    start = time.perf_counter()
+    tokens = 0
+    for _ in text_inference.create_completion(prompt, max_tokens=max_tokens, stream=True):
+        tokens += 1
+    return tokens / max(time.perf_counter() - start, 1e-9)
+
+def calibrate(load_text_model, max_tokens=64, hardware=None):
+    """Measure speed for thread counts, batch sizes and quantizations of the tier's text model; store the best.
+
+    `load_text_model(model_path, profile)` returns a text inference object. The
+    model size stays the one the memory tier picked: a smaller model is nearly
+    always faster, but calibration cannot tell what that costs in quality, so
+    switching size is left to the config file. The image model keeps the
+    detected choice because loading the vision models is far slower than a run
+    of the benchmark itself.
+    """
+    hardware = hardware or HardwareInfo()
+    base = detect_profile(hardware)
+    candidates = _quantization_variants(base['text_model'], hardware.avx2)
+    thread_counts = sorted({hardware.physical_cores, hardware.logical_cores, max(1, hardware.physical_cores // 2)})
+    # The batch buffer is sized when the model loads, so only smaller batches can be tried afterwards
+    batch_sizes = sorted({size for size in BATCH_SIZES if size <= base['n_batch']} | {base['n_batch']})
+
+    results = []
+    run = 0
+    for model in candidates:
+        profile = dict(base, text_model=model)
+        try:
+            text_inference = load_text_model(model, profile)
+        except Exception as e:
+            print(f"Skipping {model}: {e}")
+            continue
+        # Warm up once so model loading and the first prefill are not measured
+        _measure_tokens_per_second(text_inference, 8)
+        for threads in thread_counts:
+            for n_batch in batch_sizes:
+                run += 1
+                settings = dict(profile, n_threads=threads, n_batch=n_batch)
+                apply_runtime_settings(text_inference, settings)
+                speed = _measure_tokens_per_second(text_inference, max_tokens, run)
+                print(f"{model:<32} {threads:>3} threads  batch {n_batch:>4}  {speed:7.1f} tokens/s")
+                results.append((speed, settings))
+        del text_inference
+
+    if not results:
+        raise RuntimeError("No text model could be loaded for calibration.")
+    # The tier's own quantization comes first; another one must be clearly faster to replace it
+    best_speed, best = results[0]
+    for speed, settings in results[1:]:
+        if speed > best_speed * (1.1 if settings['text_model'] != best['text_model'] else 1.0):
+            best_speed, best = speed, settings
+
+    os.makedirs(CONFIG_DIR, exist_ok=True)
+    with open(CALIBRATION_FILE, 'w', encoding='utf-8') as f:
+        json.dump(dict(best, tokens_per_second=round(best_speed, 2), signature=hardware.signature(),
+                       measured=time.strftime('%Y-%m-%d %H:%M:%S')), f, indent=2)
+    return best, best_speed
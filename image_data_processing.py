@@ -4,123 +4,163 @@ import time
 from nltk.tokenize import word_tokenize
 from nltk.corpus import stopwords
 from nltk.stem import WordNetLemmatizer
-from rich.progress import Progress, TextColumn, BarColumn, TimeElapsedColumn
 from data_processing_common import sanitize_filename  # Import sanitize_filename
+from progress_dashboard import RunDashboard
+from log_writer import log_message, log_record
+from generation import (
+    collect_stream,
+    generate_short_answer,
+    generate_within_budget,
+    GenerationTimeout,
+    LatencyBudget,
+    DESCRIPTION_MAX_TOKENS,
+    TRUNCATED_DESCRIPTION_MAX_TOKENS,
+)
+from image_pipeline import ImagePrefetcher
+
+# Prompts are split into a fixed prefix and a per-file suffix so the prefix can be
+# evaluated once and reused by the prefix cache (see prompt_cache.py)
+FILENAME_PROMPT_PREFIX = """Based on the description given at the end, generate a specific and descriptive filename for the image.
+Limit the filename to a maximum of 3 words. Use nouns and avoid starting with verbs like 'depicts', 'shows', 'presents', etc.
+Do not include any data type words like 'image', 'jpg', 'png', etc. Use only letters and connect words with underscores.
+
+Example:
+Description: A photo of a sunset over the mountains.
+Filename: sunset_over_mountains
+
+Output only the filename, without any additional text.
+
+Now generate the filename.
+
+"""
+
+FOLDERNAME_PROMPT_PREFIX = """Based on the description given at the end, generate a general category or theme that best represents the main subject of this image.
+This will be used as the folder name. Limit the category to a maximum of 2 words. Use nouns and avoid verbs.
+Do not include specific details, words from the filename, or any generic terms like 'untitled' or 'unknown'.
+
+Examples:
+1. Description: A photo of a sunset over the mountains.
+   Category: landscapes
+
+2. Description: An image of a smartphone displaying a storage app with various icons and information.
+   Category: technology
+
+3. Description: A close-up of a blooming red rose with dew drops.
+   Category: nature
+
+Output only the category, without any additional text.
+
+Now generate the category.
+
+"""
+
+PROMPT_PREFIXES = (FILENAME_PROMPT_PREFIX, FOLDERNAME_PROMPT_PREFIX)
+
+# Adapts to how long images take on this machine, across batches
+latency_budget = LatencyBudget(initial=180.0)
 
-def get_text_from_generator(generator):
-    """Extract text from the generator response."""
-    response_text = ""
-    try:
-        while True:
-            response = next(generator)
-            choices = response.get('choices', [])
-            for choice in choices:
-                delta = choice.get('delta', {})
-                if 'content' in delta:
-                    response_text += delta['content']
-    except StopIteration:
-        pass
-    return response_text
-
-def process_single_image(image_path, image_inference, text_inference, silent=False, log_file=None):
+def _delta_text(response):
+    """Extract the streamed text of one chat completion chunk."""
+    return ''.join(choice.get('delta', {}).get('content') or '' for choice in response.get('choices', []))
+
+def get_text_from_generator(generator, max_pieces=None):
+    """Extract text from the generator response, stopping after max_pieces streamed deltas."""
+    return collect_stream(generator, _delta_text, max_pieces=max_pieces)
+
+def process_single_image(image_path, image_inference, text_inference, dashboard, silent=False, log_file=None, generate_foldername=True,
+                         model_image_path=None):
     """Process a single image file to generate metadata."""
     start_time = time.time()
 
-    # Create a Progress instance for this file
-    with Progress(
-        TextColumn("[progress.description]{task.description}"),
-        BarColumn(),
-        TimeElapsedColumn()
-    ) as progress:
-        task_id = progress.add_task(f"Processing {os.path.basename(image_path)}", total=1.0)
-        foldername, filename, description = generate_image_metadata(image_path, progress, task_id, image_inference, text_inference)
-    
+    dashboard.file_started(image_path)
+    # The retry asks the VLM for a much shorter description
+    metadata, fallback = generate_within_budget(
+        lambda: generate_image_metadata(image_path, dashboard, image_inference, text_inference, generate_foldername,
+                                        model_image_path),
+        lambda: generate_image_metadata(image_path, dashboard, image_inference, text_inference, generate_foldername,
+                                        model_image_path, description_max_tokens=TRUNCATED_DESCRIPTION_MAX_TOKENS),
+        latency_budget,
+    )
+    if metadata is None:
+        # Out of time twice: keep the original name and leave the image for a human to sort
+        stem = os.path.splitext(os.path.basename(image_path))[0]
+        metadata = 'others', sanitize_filename(stem), ''
+    foldername, filename, description = metadata
+    dashboard.file_finished(image_path)
+
     end_time = time.time()
     time_taken = end_time - start_time
 
     message = f"File: {image_path}\nTime taken: {time_taken:.2f} seconds\nDescription: {description}\nFolder name: {foldername}\nGenerated filename: {filename}\n"
+    if fallback:
+        message += f"Fallback: {fallback} (out of time)\n"
     if silent:
-        if log_file:
-            with open(log_file, 'a') as f:
-                f.write(message + '\n')
+        log_message(log_file, message)
     else:
         print(message)
+    log_record(log_file, event='analyze', path=image_path, seconds=time_taken, description=description,
+               foldername=foldername, filename=filename, fallback=fallback)
     return {
         'file_path': image_path,
         'foldername': foldername,
         'filename': filename,
-        'description': description
+        'description': description,
+        'fallback': fallback
     }
 
-def process_image_files(image_paths, image_inference, text_inference, silent=False, log_file=None):
-    """Process image files sequentially."""
+def process_image_files(image_paths, image_inference, text_inference, silent=False, log_file=None, dashboard=None, generate_foldername=True):
+    """Process image files in order, preparing the next images in the background."""
+    if dashboard is None:
+        # No run-level display was provided, so show one for this batch only
+        with RunDashboard(total=len(image_paths), description="Processing images") as dashboard:
+            return process_image_files(image_paths, image_inference, text_inference, silent=silent, log_file=log_file,
+                                       dashboard=dashboard, generate_foldername=generate_foldername)
     data_list = []
-    for image_path in image_paths:
-        data = process_single_image(image_path, image_inference, text_inference, silent=silent, log_file=log_file)
-        data_list.append(data)
+    # Worker processes decode and downscale upcoming images while the models handle the current one
+    with ImagePrefetcher(image_paths, dashboard=dashboard, silent=silent, log_file=log_file) as prefetcher:
+        for image_path, model_image_path in prefetcher:
+            data = process_single_image(image_path, image_inference, text_inference, dashboard, silent=silent, log_file=log_file,
+                                        generate_foldername=generate_foldername, model_image_path=model_image_path)
+            data_list.append(data)
     return data_list
 
-def generate_image_metadata(image_path, progress, task_id, image_inference, text_inference):
-    """Generate description, folder name, and filename for an image file."""
+def generate_image_metadata(image_path, dashboard, image_inference, text_inference, generate_foldername=True, model_image_path=None,
+                            description_max_tokens=DESCRIPTION_MAX_TOKENS):
+    """Generate description, folder name, and filename for an image file.
 
-    # Total steps in processing an image
-    total_steps = 3
+    model_image_path, if given, is a downscaled copy of the image to show the VLM.
+    """
 
     # Step 1: Generate description using image_inference
     description_prompt = "Please provide a detailed description of this image, focusing on the main subject and any important details."
-    description_generator = image_inference._chat(description_prompt, image_path)
-    description = get_text_from_generator(description_generator).strip()
-    progress.update(task_id, advance=1 / total_steps)
+    with dashboard.stage('description'):
+        description_generator = image_inference._chat(description_prompt, model_image_path or image_path)
+        # The chat call has no per-call token limit, so the stream is cut after the budget instead
+        description = get_text_from_generator(description_generator, max_pieces=description_max_tokens).strip()
 
     # Step 2: Generate filename using text_inference
-    filename_prompt = f"""Based on the description below, generate a specific and descriptive filename for the image.
-Limit the filename to a maximum of 3 words. Use nouns and avoid starting with verbs like 'depicts', 'shows', 'presents', etc.
-Do not include any data type words like 'image', 'jpg', 'png', etc. Use only letters and connect words with underscores.
-
-Description: {description}
-
-Example:
-Description: A photo of a sunset over the mountains.
-Filename: sunset_over_mountains
-
-Now generate the filename.
-
-Output only the filename, without any additional text.
+    filename_prompt = FILENAME_PROMPT_PREFIX + f"""Description: {description}
 
 Filename:"""
-    filename_response = text_inference.create_completion(filename_prompt)
-    filename = filename_response['choices'][0]['text'].strip()
-    # Remove 'Filename:' prefix if present
-    filename = re.sub(r'^Filename:\s*', '', filename, flags=re.IGNORECASE).strip()
-    progress.update(task_id, advance=1 / total_steps)
+    # Out of time after the description: leave the names empty so they are derived from it below
+    with dashboard.stage('filename'):
+        try:
+            filename = generate_short_answer(text_inference, filename_prompt, 'Filename')
+        except GenerationTimeout:
+            filename = ''
 
     # Step 3: Generate folder name from description using text_inference
-    foldername_prompt = f"""Based on the description below, generate a general category or theme that best represents the main subject of this image.
-This will be used as the folder name. Limit the category to a maximum of 2 words. Use nouns and avoid verbs.
-Do not include specific details, words from the filename, or any generic terms like 'untitled' or 'unknown'.
-
-Description: {description}
-
-Examples:
-1. Description: A photo of a sunset over the mountains.
-   Category: landscapes
-
-2. Description: An image of a smartphone displaying a storage app with various icons and information.
-   Category: technology
-
-3. Description: A close-up of a blooming red rose with dew drops.
-   Category: nature
-
-Now generate the category.
-
-Output only the category, without any additional text.
+    # Skipped when folders are assigned afterwards by clustering the descriptions
+    foldername = None
+    if generate_foldername:
+        foldername_prompt = FOLDERNAME_PROMPT_PREFIX + f"""Description: {description}
 
 Category:"""
-    foldername_response = text_inference.create_completion(foldername_prompt)
-    foldername = foldername_response['choices'][0]['text'].strip()
-    # Remove 'Category:' prefix if present
-    foldername = re.sub(r'^Category:\s*', '', foldername, flags=re.IGNORECASE).strip()
-    progress.update(task_id, advance=1 / total_steps)
+        with dashboard.stage('category'):
+            try:
+                foldername = generate_short_answer(text_inference, foldername_prompt, 'Category')
+            except GenerationTimeout:
+                foldername = ''
 
     # Remove any unwanted words and stopwords
     unwanted_words = set([
@@ -170,13 +210,15 @@ Category:"""
     sanitized_filename = sanitize_filename(filename, max_words=3)
 
     # Process foldername
-    foldername = clean_ai_output(foldername, max_words=2)
-    if not foldername or foldername.lower() in ('untitled', ''):
-        # Attempt to extract keywords from the description
-        foldername = clean_ai_output(description, max_words=2)
-        if not foldername:
-            foldername = 'images'
-
-    sanitized_foldername = sanitize_filename(foldername, max_words=2)
+    sanitized_foldername = None
+    if generate_foldername:
+        foldername = clean_ai_output(foldername, max_words=2)
+        if not foldername or foldername.lower() in ('untitled', ''):
+            # Attempt to extract keywords from the description
+            foldername = clean_ai_output(description, max_words=2)
+            if not foldername:
+                foldername = 'images'
+
+        sanitized_foldername = sanitize_filename(foldername, max_words=2)
 
     return sanitized_foldername, sanitized_filename, description
@@ -0,0 +1,121 @@
+import os
+import math
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+from log_writer import log_message, log_record
+
+# LLaVA-1.6 picks an "anyres" grid of at most 672x672 pixels in total (672x672,
+# 336x1344 or 1344x336), so a larger area only costs decode time. The limit is on
+# area rather than the longest side so that tall receipts and screenshots keep
+# the detail the model can use.
+DEFAULT_MAX_PIXELS = 672 * 672
+
+# Formats the model reads directly; others are re-encoded even when small
+MODEL_FORMATS = ('JPEG', 'PNG')
+
+def prepare_image(image_path, model_path, max_pixels=DEFAULT_MAX_PIXELS):
+    """Decode, downscale and re-encode an image for the model (runs in a worker process).
+
+    Returns model_path once the copy is written, or None when the original file
+    can be given to the model as it is.
+    """
+    with Image.open(image_path) as image:
+        width, height = image.size
+        if width * height <= max_pixels and image.format in MODEL_FORMATS:
+            return None
+        scale = min(1.0, math.sqrt(max_pixels / (width * height)))
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        # Let the JPEG decoder skip detail we are about to throw away
+        image.draft('RGB', size)
+        image = image.convert('RGB')
+        image.thumbnail(size)
+        # Fast, lightly compressed copy; the model reads it from disk anyway
+        image.save(model_path, format='PNG', compress_level=1)
+    return model_path
+
+class ImagePrefetcher:
+    """Prepare images in worker processes while the caller runs the model on earlier ones.
+
+    Up to `prefetch` images are in flight at once. Workers write the model-ready
+    copy themselves, so only paths cross the process boundary and the caller's
+    thread does nothing but inference. Iterating yields (image_path, model_path)
+    pairs in input order, where model_path is the compact copy (or the original
+    file when it is already small).
+    """
+
+    def __init__(self, image_paths, workers=None, prefetch=4, max_pixels=DEFAULT_MAX_PIXELS, dashboard=None,
+                 silent=False, log_file=None):
+        self.image_paths = list(image_paths)
+        self.max_pixels = max_pixels
+        self.dashboard = dashboard
+        self.silent = silent
+        self.log_file = log_file
+        self.prefetch = max(1, prefetch)
+        if workers is None:
+            workers = min(self.prefetch, max(1, (os.cpu_count() or 2) - 1))
+        # A pool is not worth starting for a single image
+        self.workers = workers if len(self.image_paths) > 1 else 0
+        self._executor = None
+        self._temp_dir = None
+
+    def __enter__(self):
+        if self.workers:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            self._temp_dir = tempfile.mkdtemp(prefix='organizer_images_')
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._executor is not None:
+            # Wait for running workers so no copy is written after the directory is cleaned up
+            self._executor.shutdown(wait=True, cancel_futures=True)
+        if self._temp_dir is not None:
+            for name in os.listdir(self._temp_dir):
+                os.remove(os.path.join(self._temp_dir, name))
+            os.rmdir(self._temp_dir)
+
+    def _report_depth(self, pending):
+        if self.dashboard is not None:
+            self.dashboard.set_queue_depth('images prefetched', sum(1 for _, future in pending if future.done()))
+
+    def __iter__(self):
+        if not self.workers:
+            for image_path in self.image_paths:
+                yield image_path, image_path
+            return
+
+        pending = deque()
+        remaining = iter(enumerate(self.image_paths))
+
+        def submit_more():
+            while len(pending) < self.prefetch:
+                item = next(remaining, None)
+                if item is None:
+                    return
+                index, image_path = item
+                model_path = os.path.join(self._temp_dir, f"{index}.png")
+                pending.append((image_path, self._executor.submit(prepare_image, image_path, model_path, self.max_pixels)))
+
+        submit_more()
+        previous_copy = None
+        while pending:
+            image_path, future = pending.popleft()
+            try:
+                model_path = future.result() or image_path
+            except Exception as e:
+                # The model gets the original file and reports its own error if it cannot read it
+                message = f"Error preparing image {image_path}: {e}"
+                if self.silent:
+                    log_message(self.log_file, message)
+                else:
+                    print(message)
+                log_record(self.log_file, event='prepare', path=image_path, error=str(e))
+                model_path = image_path
+            submit_more()
+            self._report_depth(pending)
+
+            if previous_copy is not None:
+                os.remove(previous_copy)
+            previous_copy = model_path if model_path != image_path else None
+            yield image_path, model_path
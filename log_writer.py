@@ -0,0 +1,131 @@
+import os
+import json
+import time
+import queue
+import atexit
+import threading
+
+class BufferedLogWriter:
+    """Append lines to a log file from a background thread.
+
+    Callers only enqueue lines; the writer thread drains the queue in batches,
+    writes each batch with a single call, flushes, and rotates the file once it
+    grows past `max_bytes` (keeping `backup_count` old copies as log.1, log.2, ...).
+    """
+
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, backup_count=3, flush_interval=0.5, batch_size=512):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._queue = queue.SimpleQueue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=f"log-writer:{os.path.basename(path)}", daemon=True)
+        self._thread.start()
+
+    def write(self, line):
+        """Queue a line (including its newline) for writing."""
+        if not self._closed:
+            self._queue.put(line)
+
+    def flush(self):
+        """Block until everything queued so far has been written."""
+        if self._closed:
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def _rotate(self):
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def _write_batch(self, lines):
+        if not lines:
+            return
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(''.join(lines))
+        if self.max_bytes and os.path.getsize(self.path) >= self.max_bytes:
+            self._rotate()
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+
+            # Collect whatever else is already waiting into the same batch
+            lines, waiters, stop = [], [], False
+            while True:
+                if item is None:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    lines.append(item)
+                if len(lines) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            try:
+                self._write_batch(lines)
+            except OSError as e:
+                print(f"Error writing log file {self.path}: {e}")
+            for waiter in waiters:
+                waiter.set()
+            if stop:
+                return
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+def get_log_writer(path):
+    """Return the shared writer for a log file path, creating it on first use."""
+    key = os.path.abspath(path)
+    with _writers_lock:
+        writer = _writers.get(key)
+        if writer is None:
+            writer = _writers[key] = BufferedLogWriter(path)
+        return writer
+
+def json_log_path(log_file):
+    """Return the JSON-lines companion path of a text log file."""
+    return os.path.splitext(log_file)[0] + '.jsonl'
+
+def log_message(log_file, message):
+    """Queue a plain-text message for the log file."""
+    if log_file:
+        get_log_writer(log_file).write(message + '\n')
+
+def log_record(log_file, **fields):
+    """Queue a structured record for the JSON-lines companion of the log file."""
+    if log_file:
+        fields.setdefault('time', time.time())
+        get_log_writer(json_log_path(log_file)).write(json.dumps(fields, default=str) + '\n')
+
+@atexit.register
+def close_log_writers():
+    """Flush and stop every log writer."""
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.close()
@@ -1,5 +1,8 @@
 import os
+import sys
 import time
+import argparse
+import subprocess
 
 from file_utils import (
     display_directory_tree,
@@ -16,13 +19,38 @@ from data_processing_common import (
 )
 
 from text_data_processing import (
-    process_text_files
+    process_text_files,
+    PROMPT_PREFIXES as TEXT_PROMPT_PREFIXES
 )
 
 from image_data_processing import (
-    process_image_files
+    process_image_files,
+    PROMPT_PREFIXES as IMAGE_PROMPT_PREFIXES
 )
 
+from prompt_cache import PrefixCachedInference
+
+from watch_mode import watch_directory
+
+from tree_preview import summarize_operations, print_tree_summary, export_plan
+
+from run_manifest import RunManifest, list_runs, undo_run
+
+from search_index import INDEX_NAME, SearchIndex, index_operations, remove_from_index
+
+from distributed import JOB_STORE_NAME, JobStore, enqueue_files, run_worker, wait_for_jobs
+
+from rule_engine import load_default_rules
+
+from hardware_profile import HardwareInfo, select_profile, apply_runtime_settings, calibrate, CALIBRATION_FILE
+
+from folder_clustering import consolidate_folders
+
+from generation import fallback_report
+
+from progress_dashboard import RunDashboard
+from log_writer import log_message, log_record
+
 from output_filter import filter_specific_output  # Import the context manager
 from nexa.gguf import NexaVLMInference, NexaTextInference  # Import model classes
 
@@ -37,68 +65,103 @@ def ensure_nltk_data():
 image_inference = None
 text_inference = None
 
+def load_text_model(model_path, profile):
+    """Load the text model with the context size of a hardware profile."""
+    with filter_specific_output():
+        text_model = NexaTextInference(
+            model_path=model_path,
+            local_path=None,
+            stop_words=[],
+            temperature=0.5,
+            max_new_tokens=512,  # Upper bound; each call sets its own max_tokens
+            top_k=3,
+            top_p=0.3,
+            profiling=False,
+            nctx=profile['n_ctx']
+        )
+    apply_runtime_settings(text_model, profile)
+    return text_model
+
 def initialize_models():
     """Initialize the models if they haven't been initialized yet."""
     global image_inference, text_inference
     if image_inference is None or text_inference is None:
-        # Initialize the models
-        model_path = "llava-v1.6-vicuna-7b:q4_0"
-        model_path_text = "Llama3.2-3B-Instruct:q3_K_M"
+        # Model variants, context size and threads follow the machine (see 'python main.py calibrate')
+        profile = select_profile()
+        print(f"Model profile: {profile['image_model']}, {profile['text_model']}, "
+              f"n_ctx={profile['n_ctx']}, {profile['n_threads']} threads, batch {profile['n_batch']}")
 
         # Use the filter_specific_output context manager
         with filter_specific_output():
             # Initialize the image inference model
             image_inference = NexaVLMInference(
-                model_path=model_path,
+                model_path=profile['image_model'],
                 local_path=None,
                 stop_words=[],
                 temperature=0.3,
-                max_new_tokens=3000,
+                max_new_tokens=512,  # Upper bound; descriptions are cut off earlier while streaming
                 top_k=3,
                 top_p=0.2,
-                profiling=False
-                # add n_ctx if out of context window usage: n_ctx=2048
+                profiling=False,
+                nctx=profile['n_ctx']
             )
+        apply_runtime_settings(image_inference, profile)
 
-            # Initialize the text inference model
-            text_inference = NexaTextInference(
-                model_path=model_path_text,
-                local_path=None,
-                stop_words=[],
-                temperature=0.5,
-                max_new_tokens=3000,  # Adjust as needed
-                top_k=3,
-                top_p=0.3,
-                profiling=False
-                # add n_ctx if out of context window usage: n_ctx=2048
-
-            )
+        # Initialize the text inference model, reusing the prefill of the fixed prompt prefixes
+        text_inference = PrefixCachedInference(load_text_model(profile['text_model'], profile),
+                                               prefixes=TEXT_PROMPT_PREFIXES + IMAGE_PROMPT_PREFIXES)
         print("**----------------------------------------------**")
         print("**       Image inference model initialized      **")
         print("**       Text inference model initialized       **")
         print("**----------------------------------------------**")
 
-def simulate_directory_tree(operations, base_path):
-    """Simulate the directory tree based on the proposed operations."""
-    tree = {}
-    for op in operations:
-        rel_path = os.path.relpath(op['destination'], base_path)
-        parts = rel_path.split(os.sep)
-        current_level = tree
-        for part in parts:
-            if part not in current_level:
-                current_level[part] = {}
-            current_level = current_level[part]
-    return tree
-
-def print_simulated_tree(tree, prefix=''):
-    """Print the simulated directory tree."""
-    pointers = ['├── '] * (len(tree) - 1) + ['└── '] if tree else []
-    for pointer, key in zip(pointers, tree):
-        print(prefix + pointer + key)
-        if tree[key]:  # If there are subdirectories or files
-            extension = '│   ' if pointer == '├── ' else '    '
-            print_simulated_tree(tree[key], prefix + extension)
+def analyze_files(file_paths, silent_mode=False, log_file=None, consolidate=False, rules=None):
+    """Read text files and run the models on text and image files, returning their metadata.
+
+    Files matched by a rule are named directly from the rule and skip the models.
+    """
+    rule_data = []
+    if rules is not None:
+        rule_data, file_paths = rules.apply(file_paths)
+
+    # Separate files by type
+    image_files, text_files = separate_files_by_type(file_paths)
+
+    # Prepare text tuples for processing
+    text_tuples = []
+    for fp in text_files:
+        # Use read_file_data to read the file content
+        text_content = read_file_data(fp)
+        if text_content is None:
+            message = f"Unsupported or unreadable text file format: {fp}"
+            if silent_mode:
+                log_message(log_file, message)
+                log_record(log_file, event='read', path=fp, error=message)
+            else:
+                print(message)
+            continue  # Skip unsupported or unreadable files
+        text_tuples.append((fp, text_content))
+
+    # Process files sequentially, reporting to one run-level dashboard
+    with RunDashboard(total=len(image_files) + len(text_tuples), description="Analyzing files") as dashboard:
+        data_images = process_image_files(image_files, image_inference, text_inference, silent=silent_mode, log_file=log_file,
+                                          dashboard=dashboard, generate_foldername=not consolidate)
+        data_texts = process_text_files(text_tuples, text_inference, silent=silent_mode, log_file=log_file,
+                                        dashboard=dashboard, generate_foldername=not consolidate)
+
+    # Combine all data
+    all_data = data_images + data_texts
+    if consolidate:
+        # Files that ran out of time have no description and stay in others/
+        consolidate_folders([data for data in all_data if data.get('fallback') != 'others'], text_inference)
+
+    report = fallback_report(all_data)
+    if report:
+        if silent_mode:
+            log_message(log_file, report)
+        else:
+            print(report)
+    return rule_data + all_data
 
 def get_yes_no(prompt):
     """Prompt the user for a yes/no response."""
@@ -160,8 +223,7 @@ def main():
         while not os.path.exists(input_path):
             message = f"Input path {input_path} does not exist. Please enter a valid path."
             if silent_mode:
-                with open(log_file, 'a') as f:
-                    f.write(message + '\n')
+                log_message(log_file, message)
             else:
                 print(message)
             input_path = input("Enter the path of the directory you want to organize: ").strip()
@@ -169,8 +231,7 @@ def main():
         # Confirm successful input path
         message = f"Input path successfully uploaded: {input_path}"
         if silent_mode:
-            with open(log_file, 'a') as f:
-                f.write(message + '\n')
+            log_message(log_file, message)
         else:
             print(message)
         if not silent_mode:
@@ -185,8 +246,7 @@ def main():
         # Confirm successful output path
         message = f"Output path successfully set to: {output_path}"
         if silent_mode:
-            with open(log_file, 'a') as f:
-                f.write(message + '\n')
+            log_message(log_file, message)
         else:
             print(message)
         if not silent_mode:
@@ -199,8 +259,7 @@ def main():
 
         message = f"Time taken to load file paths: {end_time - start_time:.2f} seconds"
         if silent_mode:
-            with open(log_file, 'a') as f:
-                f.write(message + '\n')
+            log_message(log_file, message)
         else:
             print(message)
         if not silent_mode:
@@ -226,37 +285,25 @@ def main():
                     print("The file upload was successful. Processing may take a few minutes.")
                     print("*" * 50)
 
-                # Prepare to collect link type statistics
-                link_type_counts = {'hardlink': 0, 'symlink': 0}
-
-                # Separate files by type
-                image_files, text_files = separate_files_by_type(file_paths)
-
-                # Prepare text tuples for processing
-                text_tuples = []
-                for fp in text_files:
-                    # Use read_file_data to read the file content
-                    text_content = read_file_data(fp)
-                    if text_content is None:
-                        message = f"Unsupported or unreadable text file format: {fp}"
-                        if silent_mode:
-                            with open(log_file, 'a') as f:
-                                f.write(message + '\n')
-                        else:
-                            print(message)
-                        continue  # Skip unsupported or unreadable files
-                    text_tuples.append((fp, text_content))
-
-                # Process files sequentially
-                data_images = process_image_files(image_files, image_inference, text_inference, silent=silent_mode, log_file=log_file)
-                data_texts = process_text_files(text_tuples, text_inference, silent=silent_mode, log_file=log_file)
+                # Optionally group similar files with one category call per cluster instead of one per file
+                consolidate = get_yes_no("Would you like to group similar files into shared folders (fewer model calls)? (yes/no): ")
+
+                # Read and analyze every supported file, letting rules handle known patterns first
+                rules = load_default_rules()
+                all_data = analyze_files(file_paths, silent_mode, log_file, consolidate=consolidate, rules=rules)
+                if rules is not None:
+                    message = rules.summary()
+                    if silent_mode:
+                        log_message(log_file, message)
+                    else:
+                        print(message)
 
                 # Prepare for copying and renaming
                 renamed_files = set()
                 processed_files = set()
 
-                # Combine all data
-                all_data = data_images + data_texts
+                if not silent_mode:
+                    print(text_inference.summary())
 
                 # Compute the operations
                 operations = compute_operations(
@@ -280,14 +327,17 @@ def main():
             print("-" * 50)
             message = "Proposed directory structure:"
             if silent_mode:
-                with open(log_file, 'a') as f:
-                    f.write(message + '\n')
+                log_message(log_file, message)
             else:
                 print(message)
                 print(os.path.abspath(output_path))
-                simulated_tree = simulate_directory_tree(operations, output_path)
-                print_simulated_tree(simulated_tree)
+                summary = summarize_operations(operations, output_path)
+                truncated = print_tree_summary(summary)
                 print("-" * 50)
+                if truncated and get_yes_no("Only part of the plan is shown. Export the full plan to a file? (yes/no): "):
+                    plan_file = 'proposed_plan.tsv'
+                    export_plan(operations, plan_file)
+                    print(f"Full plan written to {os.path.abspath(plan_file)}")
 
             # Ask user if they want to proceed
             proceed = get_yes_no("Would you like to proceed with these changes? (yes/no): ")
@@ -298,21 +348,31 @@ def main():
                 # Perform the actual file operations
                 message = "Performing file operations..."
                 if silent_mode:
-                    with open(log_file, 'a') as f:
-                        f.write(message + '\n')
+                    log_message(log_file, message)
                 else:
                     print(message)
+                # Record created links so the run can be undone with 'python main.py undo'
+                manifest = RunManifest(output_path, mode)
                 execute_operations(
                     operations,
                     dry_run=False,
                     silent=silent_mode,
-                    log_file=log_file
+                    log_file=log_file,
+                    manifest=manifest
                 )
+                manifest.finish()
+                if mode == 'content':
+                    # Keep the descriptions searchable with 'python main.py search'
+                    indexed = index_operations(output_path, operations, all_data)
+                    message = f"Indexed {indexed} file(s) for search."
+                    if silent_mode:
+                        log_message(log_file, message)
+                    else:
+                        print(message)
 
                 message = "The files have been organized successfully."
                 if silent_mode:
-                    with open(log_file, 'a') as f:
-                        f.write("-" * 50 + '\n' + message + '\n' + "-" * 50 + '\n')
+                    log_message(log_file, "-" * 50 + '\n' + message + '\n' + "-" * 50)
                 else:
                     print("-" * 50)
                     print(message)
@@ -333,5 +393,267 @@ def main():
             break  # Exit the main loop
 
 
+def run_watch(args):
+    """Keep the models loaded and organize new or changed files by content as they arrive."""
+    ensure_nltk_data()
+    input_path = args.input_path
+    output_path = args.output or os.path.join(os.path.dirname(os.path.abspath(input_path)), 'organized_folder')
+    silent_mode = args.log_file is not None
+    log_file = args.log_file
+
+    initialize_models()
+    manifest = RunManifest(output_path, 'watch')
+    rules = load_default_rules()
+
+    # Destinations already in the output folder must not be reused
+    renamed_files = set(collect_file_paths(output_path)) if os.path.isdir(output_path) else set()
+    organized = {}
+
+    def report(message):
+        if silent_mode:
+            log_message(log_file, message)
+        else:
+            print(message)
+
+    def analyze_batch(file_paths):
+        """Analyze a batch, retrying file by file if it fails so one bad file only costs itself."""
+        try:
+            return analyze_files(file_paths, silent_mode, log_file, rules=rules)
+        except Exception as e:
+            if len(file_paths) == 1:
+                report(f"Error analyzing {file_paths[0]}: {e}")
+                log_record(log_file, event='analyze', path=file_paths[0], error=str(e))
+                return []
+        all_data = []
+        for file_path in file_paths:
+            all_data.extend(analyze_batch([file_path]))
+        return all_data
+
+    def organize_batch(file_paths):
+        report(f"Organizing {len(file_paths)} new or changed file(s)...")
+        all_data = analyze_batch(file_paths)
+
+        # A changed file replaces the link created for its previous version; the old
+        # destination is released first so the new one can take the same name
+        replaced = []
+        for data in all_data:
+            previous = organized.pop(data['file_path'], None)
+            if previous and os.path.lexists(previous):
+                os.remove(previous)
+                replaced.append(previous)
+            renamed_files.discard(previous)
+        remove_from_index(output_path, replaced)
+
+        operations = compute_operations(all_data, output_path, renamed_files, set())
+        execute_operations(operations, dry_run=False, silent=silent_mode, log_file=log_file, manifest=manifest)
+        manifest.flush()
+        index_operations(output_path, operations, all_data)
+        organized.update((operation['source'], operation['destination']) for operation in operations)
+
+    watch_directory(
+        input_path,
+        organize_batch,
+        ignore_dir=output_path,
+        debounce=args.debounce,
+        force_polling=args.polling,
+        poll_interval=args.poll_interval,
+        process_existing=args.process_existing,
+    )
+    manifest.finish()
+
+def run_coordinator(args):
+    """Queue content analysis for workers, then organize everything once all results are in."""
+    # Workers run in other directories or on other nodes, so only absolute paths are queued
+    input_path = os.path.abspath(args.input_path)
+    output_path = os.path.abspath(args.output or os.path.join(os.path.dirname(input_path), 'organized_folder'))
+    store_path = os.path.abspath(args.store or os.path.join(output_path, JOB_STORE_NAME))
+    os.makedirs(os.path.dirname(store_path), exist_ok=True)
+
+    file_paths = collect_file_paths(input_path)
+    rules = load_default_rules()
+    rule_data = []
+    if rules is not None:
+        rule_data, file_paths = rules.apply(file_paths)
+        print(rules.summary())
+    image_files, text_files = separate_files_by_type(file_paths)
+    file_paths = image_files + text_files
+
+    # An existing store is reused, so an interrupted run only analyzes what is left
+    store = JobStore(store_path)
+    store.set_meta('enqueue_done', 0)
+    start_time = time.time()
+    unreadable = enqueue_files(store, file_paths)
+    print(f"Queued {len(file_paths) - len(unreadable)} file(s) in {store_path} in {time.time() - start_time:.2f} seconds.")
+    print(f"Start workers with: python main.py worker {store_path}")
+
+    local_workers = [
+        subprocess.Popen([sys.executable, os.path.abspath(__file__), 'worker', store_path,
+                          '--batch-size', str(args.batch_size), '--max-attempts', str(args.max_attempts)])
+        for _ in range(args.local_workers)
+    ]
+
+    def report(counts):
+        print(f"done {counts['done']}, in progress {counts['leased']}, pending {counts['pending']}, failed {counts['failed']}")
+
+    try:
+        wait_for_jobs(store, args.max_attempts, poll_interval=args.poll_interval, on_progress=report)
+    finally:
+        for process in local_workers:
+            process.wait()
+
+    wanted = set(file_paths)
+    all_data = rule_data + [data for data in store.results() if data['file_path'] in wanted]
+    failures = [(path, error) for path, error in store.failures() if path in wanted]
+    store.close()
+    for path, error in failures:
+        print(f"Not analyzed: {path}: {error}")
+    report = fallback_report(all_data)
+    if report:
+        print(report)
+
+    renamed_files = set(collect_file_paths(output_path)) if os.path.isdir(output_path) else set()
+    operations = compute_operations(all_data, output_path, renamed_files, set())
+    print("-" * 50)
+    print("Proposed directory structure:")
+    print(os.path.abspath(output_path))
+    print_tree_summary(summarize_operations(operations, output_path))
+    print("-" * 50)
+    if not args.yes and not get_yes_no("Would you like to proceed with these changes? (yes/no): "):
+        print("Operation canceled by the user.")
+        return
+
+    manifest = RunManifest(output_path, 'distributed')
+    execute_operations(operations, dry_run=False, manifest=manifest)
+    manifest.finish()
+    indexed = index_operations(output_path, operations, all_data)
+    print(f"Organized {len(operations)} file(s); indexed {indexed} for search.")
+
+def run_worker_command(args):
+    """Load the models and analyze queued files until the coordinator's queue is finished."""
+    ensure_nltk_data()
+    initialize_models()
+    silent_mode = args.log_file is not None
+    shard = None
+    if args.shard:
+        index, count = (int(part) for part in args.shard.split('/'))
+        shard = (index, count)
+
+    completed = run_worker(
+        args.store,
+        lambda file_paths: analyze_files(file_paths, silent_mode, args.log_file),
+        batch_size=args.batch_size,
+        lease=args.lease,
+        max_attempts=args.max_attempts,
+        shard=shard,
+        poll_interval=args.poll_interval,
+    )
+    print(f"Worker finished after analyzing {completed} file(s).")
+
+def run_undo(args):
+    """List recorded runs or remove the links created by one of them."""
+    if args.list:
+        runs = list_runs(args.output_path)
+        if not runs:
+            print(f"No recorded runs in {args.output_path}")
+        for run_id, mode, started, status, count in runs:
+            print(f"{run_id:>5}  {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(started))}  {mode:<8} {status:<12} {count} link(s)")
+        return
+    start_time = time.time()
+    removed, kept = undo_run(args.output_path, args.run, workers=args.workers)
+    print(f"Removed {removed} link(s) in {time.time() - start_time:.2f} seconds.")
+    if kept:
+        print(f"Kept {len(kept)} file(s) whose original no longer exists, so the organized copy is the last one:")
+        for destination in kept:
+            print(f"  {destination}")
+
+def run_search(args):
+    """Query the full-text index of an output directory."""
+    if not os.path.exists(os.path.join(args.output_path, INDEX_NAME)):
+        print(f"No search index in {args.output_path}; organize files by content first.")
+        return
+    index = SearchIndex(args.output_path)
+    try:
+        if args.prune:
+            print(f"Removed {index.prune_missing()} stale index entries.")
+        start_time = time.time()
+        results = index.search(' '.join(args.query), limit=args.limit)
+    finally:
+        index.close()
+    for destination, folder, snippet in results:
+        print(destination)
+        print(f"    {snippet}")
+    print(f"{len(results)} result(s) in {(time.time() - start_time) * 1000:.1f} ms.")
+
+def run_calibrate(args):
+    """Measure text generation speed on this machine and store the fastest profile."""
+    hardware = HardwareInfo()
+    print(f"Hardware: {hardware.describe()}")
+    best, speed = calibrate(load_text_model, max_tokens=args.tokens, hardware=hardware)
+    print(f"Best profile: {best['text_model']} with {best['n_threads']} threads ({speed:.1f} tokens/s)")
+    print(f"Saved to {CALIBRATION_FILE}")
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Organize local files by content, date or type. Runs interactively without a command.")
+    subparsers = parser.add_subparsers(dest='command')
+
+    watch_parser = subparsers.add_parser('watch', help="Organize files by content as they arrive in a directory")
+    watch_parser.add_argument('input_path', help="Directory to watch")
+    watch_parser.add_argument('--output', help="Output directory (default: 'organized_folder' next to the input)")
+    watch_parser.add_argument('--debounce', type=float, default=2.0, help="Seconds of quiet before a batch is processed")
+    watch_parser.add_argument('--polling', action='store_true', help="Poll for changes instead of using inotify")
+    watch_parser.add_argument('--poll-interval', type=float, default=5.0, help="Seconds between polls")
+    watch_parser.add_argument('--process-existing', action='store_true', help="Also organize files already present")
+    watch_parser.add_argument('--log-file', help="Log to this file instead of the terminal")
+
+    undo_parser = subparsers.add_parser('undo', help="Remove the links created by an earlier run")
+    undo_parser.add_argument('output_path', help="Output directory of the run")
+    undo_parser.add_argument('--run', type=int, help="Run id to undo (default: the latest run)")
+    undo_parser.add_argument('--list', action='store_true', help="List recorded runs instead of undoing")
+    undo_parser.add_argument('--workers', type=int, default=16, help="Parallel unlink threads")
+
+    search_parser = subparsers.add_parser('search', help="Search organized files by description and content")
+    search_parser.add_argument('output_path', help="Output directory that was organized by content")
+    search_parser.add_argument('query', nargs='+', help="Words or an FTS5 query, e.g. 'invoice AND 2023'")
+    search_parser.add_argument('--limit', type=int, default=20, help="Maximum number of results")
+    search_parser.add_argument('--prune', action='store_true', help="First drop entries whose files no longer exist")
+
+    coordinator_parser = subparsers.add_parser('coordinator', help="Queue content analysis for workers and organize the results")
+    coordinator_parser.add_argument('input_path', help="Directory to organize")
+    coordinator_parser.add_argument('--output', help="Output directory (default: 'organized_folder' next to the input)")
+    coordinator_parser.add_argument('--store', help=f"Job store path, on storage shared with the workers (default: {JOB_STORE_NAME} in the output)")
+    coordinator_parser.add_argument('--local-workers', type=int, default=0, help="Start this many worker processes on this machine")
+    coordinator_parser.add_argument('--batch-size', type=int, default=4, help="Files claimed per batch by local workers")
+    coordinator_parser.add_argument('--max-attempts', type=int, default=3, help="Attempts per file before it is given up")
+    coordinator_parser.add_argument('--poll-interval', type=float, default=10.0, help="Seconds between progress reports")
+    coordinator_parser.add_argument('--yes', action='store_true', help="Organize without asking for confirmation")
+
+    worker_parser = subparsers.add_parser('worker', help="Analyze files queued by a coordinator")
+    worker_parser.add_argument('store', help="Job store path printed by the coordinator")
+    worker_parser.add_argument('--batch-size', type=int, default=4, help="Files claimed per batch")
+    worker_parser.add_argument('--lease', type=float, default=600.0, help="Seconds before an unfinished batch is handed to another worker")
+    worker_parser.add_argument('--max-attempts', type=int, default=3, help="Attempts per file before it is given up")
+    worker_parser.add_argument('--shard', help="Only take jobs of shard INDEX/COUNT, e.g. 0/4")
+    worker_parser.add_argument('--poll-interval', type=float, default=5.0, help="Seconds to wait when no job is available")
+    worker_parser.add_argument('--log-file', help="Log to this file instead of the terminal")
+
+    calibrate_parser = subparsers.add_parser('calibrate', help="Measure model speed on this machine and store the best profile")
+    calibrate_parser.add_argument('--tokens', type=int, default=64, help="Tokens generated per measurement")
+
+    return parser.parse_args()
+
 if __name__ == '__main__':
-    main()
+    args = parse_arguments()
+    if args.command == 'watch':
+        run_watch(args)
+    elif args.command == 'undo':
+        run_undo(args)
+    elif args.command == 'search':
+        run_search(args)
+    elif args.command == 'calibrate':
+        run_calibrate(args)
+    elif args.command == 'coordinator':
+        run_coordinator(args)
+    elif args.command == 'worker':
+        run_worker_command(args)
+    else:
+        main()
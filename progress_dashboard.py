@@ -0,0 +1,170 @@
+import os
+import sys
+import time
+import queue
+import threading
+import contextlib
+from collections import deque
+from rich.console import Console
+from rich.live import Live
+from rich.table import Table
+
+class RunDashboard:
+    """Run-level progress and telemetry display shared by all files and workers.
+
+    Workers only push small event tuples onto a SimpleQueue, which never blocks the
+    producer; a single refresh thread drains it, aggregates the numbers and redraws
+    at a fixed rate. When stdout is not a terminal the display degrades to one plain
+    log line every `log_interval` seconds.
+    """
+
+    def __init__(self, total=0, description="Processing files", refresh_per_second=4, log_interval=10.0, console=None):
+        self.description = description
+        self.refresh_interval = 1.0 / refresh_per_second
+        self.log_interval = log_interval
+        self.console = console or Console()
+        self.interactive = self.console.is_terminal and sys.stdout.isatty()
+
+        self._events = queue.SimpleQueue()
+        self._stop = threading.Event()
+        self._thread = None
+        self._live = None
+
+        # Aggregates, only touched by the refresh thread
+        self.total = total
+        self.completed = 0
+        self.active = {}
+        self.queue_depths = {}
+        self.stage_latencies = {}
+        self.start_time = None
+        self._last_log = 0.0
+
+    # Producer side: safe to call from any thread
+
+    def add_total(self, count):
+        self._events.put(('total', count, None))
+
+    def file_started(self, path):
+        self._events.put(('start', path, time.perf_counter()))
+
+    def file_finished(self, path):
+        self._events.put(('finish', path, time.perf_counter()))
+
+    def record_stage(self, stage, seconds):
+        self._events.put(('stage', stage, seconds))
+
+    def set_queue_depth(self, name, depth):
+        self._events.put(('queue', name, depth))
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Time a block of work and report it as a stage latency."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_stage(name, time.perf_counter() - start)
+
+    # Consumer side
+
+    def _drain(self):
+        while True:
+            try:
+                kind, key, value = self._events.get_nowait()
+            except queue.Empty:
+                return
+            if kind == 'total':
+                self.total += key
+            elif kind == 'start':
+                self.active[key] = value
+            elif kind == 'finish':
+                self.active.pop(key, None)
+                self.completed += 1
+            elif kind == 'stage':
+                self.stage_latencies.setdefault(key, deque(maxlen=200)).append(value)
+            elif kind == 'queue':
+                self.queue_depths[key] = value
+
+    def _rate_and_eta(self):
+        elapsed = time.perf_counter() - self.start_time
+        rate = self.completed / elapsed if elapsed > 0 else 0.0
+        remaining = max(self.total - self.completed, 0)
+        eta = remaining / rate if rate > 0 else None
+        return elapsed, rate, eta
+
+    def _render(self):
+        elapsed, rate, eta = self._rate_and_eta()
+        table = Table.grid(padding=(0, 2))
+        table.add_row(
+            f"[bold]{self.description}[/bold]",
+            f"{self.completed}/{self.total} files",
+            f"{rate:.2f} files/s",
+            f"elapsed {_format_seconds(elapsed)}",
+            f"ETA {_format_seconds(eta)}",
+        )
+        if self.queue_depths:
+            table.add_row("Queues", *[f"{name}: {depth}" for name, depth in sorted(self.queue_depths.items())])
+        for stage, samples in self.stage_latencies.items():
+            ordered = sorted(samples)
+            p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+            table.add_row(f"  {stage}", f"mean {sum(ordered) / len(ordered):.2f}s", f"p95 {p95:.2f}s", f"n={len(ordered)}")
+        for path in list(self.active)[:3]:
+            table.add_row("  active", os.path.basename(path))
+        return table
+
+    def _log_line(self):
+        elapsed, rate, eta = self._rate_and_eta()
+        stages = ', '.join(
+            f"{stage}={sum(samples) / len(samples):.2f}s" for stage, samples in self.stage_latencies.items()
+        )
+        queues = ', '.join(f"{name}={depth}" for name, depth in sorted(self.queue_depths.items()))
+        line = (f"{self.description}: {self.completed}/{self.total} files, {rate:.2f} files/s, "
+                f"elapsed {_format_seconds(elapsed)}, ETA {_format_seconds(eta)}")
+        if stages:
+            line += f" | stages: {stages}"
+        if queues:
+            line += f" | queues: {queues}"
+        print(line, flush=True)
+
+    def _run(self):
+        while not self._stop.wait(self.refresh_interval):
+            self._drain()
+            if self._live is not None:
+                self._live.update(self._render(), refresh=True)
+            elif time.perf_counter() - self._last_log >= self.log_interval:
+                self._last_log = time.perf_counter()
+                self._log_line()
+
+    def start(self):
+        self.start_time = time.perf_counter()
+        self._last_log = self.start_time
+        if self.interactive:
+            self._live = Live(self._render(), console=self.console, auto_refresh=False, transient=True)
+            self._live.start()
+        self._thread = threading.Thread(target=self._run, name="run-dashboard", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._drain()
+        if self._live is not None:
+            self._live.stop()
+            self._live = None
+        if self.completed:
+            self._log_line()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+def _format_seconds(seconds):
+    """Format a duration as H:MM:SS, or '--' when unknown."""
+    if seconds is None:
+        return '--'
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
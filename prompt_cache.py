@@ -0,0 +1,80 @@
+from collections import OrderedDict
+
+class PrefixCachedInference:
+    """Wrap a text inference model so fixed prompt prefixes are only prefilled once.
+
+    The first time a registered prefix is seen it is evaluated on its own and the
+    llama.cpp state (KV cache and token history) is saved. Later prompts starting
+    with the same prefix restore that state first, so llama.cpp's longest-prefix
+    matching only has to evaluate the per-file suffix. Models that do not expose
+    state save/load are used unchanged.
+    """
+
+    def __init__(self, inference, prefixes=(), max_states=4):
+        self._inference = inference
+        self._prefixes = []
+        self._states = OrderedDict()
+        self.max_states = max_states
+        self.stats = {'calls': 0, 'cached_calls': 0, 'prompt_tokens': 0, 'reused_tokens': 0}
+
+        self._llama = getattr(inference, 'model', None)
+        self.enabled = all(hasattr(self._llama, name) for name in ('tokenize', 'reset', 'eval', 'save_state', 'load_state'))
+        for prefix in prefixes:
+            self.register_prefix(prefix)
+
+    def __getattr__(self, name):
+        # Everything except create_completion goes straight to the wrapped model
+        return getattr(self._inference, name)
+
+    def register_prefix(self, prefix):
+        if prefix and prefix not in self._prefixes:
+            self._prefixes.append(prefix)
+            # Prefer the longest matching prefix
+            self._prefixes.sort(key=len, reverse=True)
+
+    def _tokenize(self, text):
+        return self._llama.tokenize(text.encode('utf-8'))
+
+    def _restore_prefix(self, prefix):
+        """Load the saved state for a prefix, building it first if needed; returns tokens reused."""
+        entry = self._states.get(prefix)
+        if entry is not None:
+            self._states.move_to_end(prefix)
+            state, token_count = entry
+            self._llama.load_state(state)
+            return token_count
+
+        tokens = self._tokenize(prefix)
+        self._llama.reset()
+        self._llama.eval(tokens)
+        self._states[prefix] = (self._llama.save_state(), len(tokens))
+        while len(self._states) > self.max_states:
+            self._states.popitem(last=False)
+        return 0
+
+    def create_completion(self, prompt, *args, **kwargs):
+        self.stats['calls'] += 1
+        if self.enabled:
+            prefix = next((p for p in self._prefixes if prompt.startswith(p)), None)
+            self.stats['prompt_tokens'] += len(self._tokenize(prompt))
+            if prefix is not None:
+                try:
+                    reused = self._restore_prefix(prefix)
+                except Exception as e:
+                    # A failed restore only costs the saving, never the completion
+                    print(f"Prompt prefix cache disabled: {e}")
+                    self.enabled = False
+                    self._states.clear()
+                else:
+                    self.stats['reused_tokens'] += reused
+                    self.stats['cached_calls'] += bool(reused)
+        return self._inference.create_completion(prompt, *args, **kwargs)
+
+    def summary(self):
+        """Return a one-line report of prefill tokens saved so far."""
+        if not self.enabled or not self.stats['prompt_tokens']:
+            return "Prompt prefix cache: inactive"
+        saved = self.stats['reused_tokens'] / self.stats['prompt_tokens']
+        per_call = (self.stats['prompt_tokens'] - self.stats['reused_tokens']) / self.stats['calls']
+        return (f"Prompt prefix cache: reused {self.stats['reused_tokens']} of {self.stats['prompt_tokens']} prompt tokens "
+                f"({saved:.0%}), {per_call:.0f} prefill tokens per call")
@@ -0,0 +1,205 @@
+import os
+import re
+import fnmatch
+import datetime
+import tomllib
+from PIL import Image, ExifTags
+
+# Rules file picked up automatically when present (override with ORGANIZER_RULES)
+DEFAULT_RULES_FILE = 'organizer_rules.toml'
+
+RULE_KEYS = {
+    'name', 'glob', 'regex', 'filename_regex', 'extensions', 'min_size', 'max_size', 'exif', 'folder', 'filename',
+}
+# Tags from IFD0, the Exif IFD (capture settings such as DateTimeOriginal) and the GPS IFD
+EXIF_TAG_NAMES = set(ExifTags.TAGS.values()) | set(ExifTags.GPSTAGS.values())
+UNSAFE_CHARS = re.compile(r'[<>:"\\|?*\x00-\x1f]')
+
+class RuleError(ValueError):
+    """Raised when a rules file is malformed."""
+
+class FileFacts:
+    """Lazily computed attributes of one file, shared by all rules evaluated against it."""
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.stem, self.ext = os.path.splitext(self.name)
+        self.ext = self.ext.lower()
+        self._stat = None
+        self._exif = None
+
+    @property
+    def stat(self):
+        if self._stat is None:
+            self._stat = os.stat(self.path)
+        return self._stat
+
+    @property
+    def exif(self):
+        if self._exif is None:
+            self._exif = {}
+            try:
+                with Image.open(self.path) as image:
+                    exif = image.getexif()
+                    # getexif() only holds IFD0; the sub-IFDs are read through their pointers
+                    for ifd, names in ((exif, ExifTags.TAGS), (exif.get_ifd(ExifTags.IFD.Exif), ExifTags.TAGS),
+                                       (exif.get_ifd(ExifTags.IFD.GPSInfo), ExifTags.GPSTAGS)):
+                        for tag, value in ifd.items():
+                            self._exif[names.get(tag, str(tag))] = value
+            except Exception:
+                pass
+        return self._exif
+
+    def template_values(self, include_exif=False):
+        mtime = datetime.datetime.fromtimestamp(self.stat.st_mtime)
+        values = {
+            'stem': self.stem,
+            'ext': self.ext.lstrip('.'),
+            'parent': os.path.basename(os.path.dirname(self.path)),
+            'year': mtime.strftime('%Y'),
+            'month': mtime.strftime('%m'),
+            'day': mtime.strftime('%d'),
+            'size': self.stat.st_size,
+        }
+        if include_exif:
+            for tag, value in self.exif.items():
+                values[f'exif_{tag}'] = str(value).strip('\x00 ')
+        return values
+
+class _Blank(dict):
+    """Template values where unknown placeholders render as empty strings."""
+
+    def __missing__(self, key):
+        return ''
+
+def _as_list(value):
+    if value is None:
+        return []
+    return [value] if isinstance(value, str) else list(value)
+
+class Rule:
+    """One compiled rule: predicates ordered from cheapest to most expensive, plus output templates."""
+
+    def __init__(self, spec, index):
+        unknown = set(spec) - RULE_KEYS
+        if unknown:
+            raise RuleError(f"Rule {index + 1}: unknown keys {sorted(unknown)}")
+        if 'folder' not in spec:
+            raise RuleError(f"Rule {index + 1}: 'folder' is required")
+        self.name = spec.get('name', f"rule_{index + 1}")
+        self.extensions = {e.lower() if e.startswith('.') else '.' + e.lower() for e in _as_list(spec.get('extensions'))}
+        # Patterns with a path separator match the whole path, others only the file name
+        self.path_globs = [re.compile(fnmatch.translate(g)) for g in _as_list(spec.get('glob')) if '/' in g]
+        self.name_globs = [re.compile(fnmatch.translate(g), re.IGNORECASE) for g in _as_list(spec.get('glob')) if '/' not in g]
+        self.path_regex = re.compile(spec['regex']) if 'regex' in spec else None
+        self.name_regex = re.compile(spec['filename_regex']) if 'filename_regex' in spec else None
+        self.min_size = spec.get('min_size')
+        self.max_size = spec.get('max_size')
+        self.exif = {tag: re.compile(pattern) for tag, pattern in spec.get('exif', {}).items()}
+        for tag in self.exif:
+            if tag not in EXIF_TAG_NAMES:
+                raise RuleError(f"Rule {self.name}: unknown EXIF tag {tag!r}")
+        self.folder = spec['folder']
+        self.filename = spec.get('filename', '{stem}')
+
+    def matches(self, facts):
+        if self.extensions and facts.ext not in self.extensions:
+            return False
+        if self.name_globs and not any(g.match(facts.name) for g in self.name_globs):
+            return False
+        if self.path_globs and not any(g.match(facts.path.replace(os.sep, '/')) for g in self.path_globs):
+            return False
+        if self.name_regex and not self.name_regex.search(facts.name):
+            return False
+        if self.path_regex and not self.path_regex.search(facts.path):
+            return False
+        if self.min_size is not None and facts.stat.st_size < self.min_size:
+            return False
+        if self.max_size is not None and facts.stat.st_size > self.max_size:
+            return False
+        for tag, pattern in self.exif.items():
+            value = facts.exif.get(tag)
+            if value is None or not pattern.search(str(value)):
+                return False
+        return True
+
+    def render(self, facts):
+        """Return (folder, filename) for a matching file."""
+        values = _Blank(facts.template_values(include_exif='{exif_' in self.folder + self.filename))
+        folder_parts = [UNSAFE_CHARS.sub('', part).strip() for part in self.folder.format_map(values).split('/')]
+        folder = os.path.join(*[part for part in folder_parts if part not in ('', '.', '..')] or ['others'])
+        filename = UNSAFE_CHARS.sub('', self.filename.format_map(values)).replace('/', '_').strip() or facts.stem
+        return folder, filename
+
+class RuleSet:
+    """Ordered rules evaluated before inference; the first matching rule wins."""
+
+    def __init__(self, rules, source=None):
+        self.rules = rules
+        self.source = source
+        self.hits = {rule.name: 0 for rule in rules}
+        self.evaluated = 0
+
+    def match(self, file_path):
+        """Return the metadata dict for a file matched by a rule, or None."""
+        self.evaluated += 1
+        facts = FileFacts(file_path)
+        for rule in self.rules:
+            try:
+                if not rule.matches(facts):
+                    continue
+                folder, filename = rule.render(facts)
+            except OSError:
+                return None
+            self.hits[rule.name] += 1
+            return {
+                'file_path': file_path,
+                'foldername': folder,
+                'filename': filename,
+                'description': f"Matched rule '{rule.name}'",
+            }
+        return None
+
+    def apply(self, file_paths):
+        """Split files into (metadata of rule matches, paths left for the model)."""
+        matched, unmatched = [], []
+        for file_path in file_paths:
+            data = self.match(file_path)
+            if data is None:
+                unmatched.append(file_path)
+            else:
+                matched.append(data)
+        return matched, unmatched
+
+    def summary(self):
+        total_hits = sum(self.hits.values())
+        lines = [f"Rules matched {total_hits} of {self.evaluated} files"
+                 + (f" ({total_hits / self.evaluated:.0%})" if self.evaluated else '')]
+        for name, hits in self.hits.items():
+            lines.append(f"  {name}: {hits}")
+        return '\n'.join(lines)
+
+def load_rules(path):
+    """Load a TOML (or, with PyYAML installed, YAML) rules file with a list of [[rule]] tables."""
+    with open(path, 'rb') as f:
+        if path.lower().endswith(('.yaml', '.yml')):
+            import yaml  # Optional dependency, only needed for YAML rules
+            document = yaml.safe_load(f) or {}
+        else:
+            document = tomllib.load(f)
+    specs = document.get('rule', document.get('rules', []))
+    if not isinstance(specs, list):
+        raise RuleError("The rules file must contain a list of rules under 'rule'")
+    return RuleSet([Rule(spec, index) for index, spec in enumerate(specs)], source=path)
+
+def load_default_rules():
+    """Load the rules file named by ORGANIZER_RULES or found in the working directory, if any."""
+    path = os.environ.get('ORGANIZER_RULES') or DEFAULT_RULES_FILE
+    if not os.path.exists(path):
+        return None
+    try:
+        return load_rules(path)
+    except Exception as e:
+        print(f"Error loading rules file {path}: {e}")
+        return None
@@ -0,0 +1,195 @@
+import os
+import time
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from search_index import remove_from_index
+
+MANIFEST_NAME = '.organizer_manifest.sqlite'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    mode TEXT,
+    started REAL,
+    finished REAL,
+    status TEXT
+);
+CREATE TABLE IF NOT EXISTS entries (
+    run_id INTEGER NOT NULL,
+    source TEXT NOT NULL,
+    destination TEXT NOT NULL,
+    link_type TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_run ON entries (run_id);
+"""
+
+def manifest_path(output_path):
+    return os.path.join(output_path, MANIFEST_NAME)
+
+def connect_manifest(output_path):
+    """Open (and create if needed) the manifest database of an output directory."""
+    os.makedirs(output_path, exist_ok=True)
+    connection = sqlite3.connect(manifest_path(output_path))
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(SCHEMA)
+    return connection
+
+class RunManifest:
+    """Record every link created by one organize run so it can be undone in bulk."""
+
+    def __init__(self, output_path, mode, batch_size=5000):
+        self.output_path = output_path
+        self.batch_size = batch_size
+        self._pending = []
+        self._connection = connect_manifest(output_path)
+        with self._connection:
+            cursor = self._connection.execute(
+                "INSERT INTO runs (mode, started, status) VALUES (?, ?, 'running')", (mode, time.time()))
+        self.run_id = cursor.lastrowid
+
+    def record(self, source, destination, link_type):
+        self._pending.append((self.run_id, source, destination, link_type))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            with self._connection:
+                self._connection.executemany(
+                    "INSERT INTO entries (run_id, source, destination, link_type) VALUES (?, ?, ?, ?)", self._pending)
+            self._pending = []
+
+    def _set_status(self, status):
+        with self._connection:
+            self._connection.execute("UPDATE runs SET status = ?, finished = ? WHERE id = ?", (status, time.time(), self.run_id))
+
+    def finish(self):
+        """Mark the run as completed."""
+        self.flush()
+        self._set_status('completed')
+        self._connection.close()
+
+    def checkpoint(self):
+        """Mark the current end of the run, so a later rollback only undoes what follows it."""
+        self.flush()
+        row = self._connection.execute("SELECT COALESCE(MAX(rowid), 0) FROM entries").fetchone()
+        return row[0]
+
+    def rollback(self, checkpoint=0):
+        """Remove the links recorded after a checkpoint (everything by default).
+
+        The manifest stays open, so a long-running caller such as watch mode can
+        keep recording and finish the run afterwards. The run is only marked as
+        rolled back once none of its links remain.
+        """
+        self.flush()
+        removed, kept = _undo_entries(self._connection, self.output_path, "run_id = ? AND rowid > ?",
+                                      (self.run_id, checkpoint))
+        remaining = self._connection.execute("SELECT COUNT(*) FROM entries WHERE run_id = ?", (self.run_id,)).fetchone()[0]
+        if not remaining:
+            self._set_status('rolled_back')
+        print(f"Rolled back {removed} link(s) created by the failed operations.")
+        if kept:
+            print(f"Kept {len(kept)} link(s) that are the last copy of their file.")
+
+def list_runs(output_path):
+    """Return (id, mode, started, status, entry count) for every recorded run, newest first."""
+    if not os.path.exists(manifest_path(output_path)):
+        return []
+    connection = connect_manifest(output_path)
+    try:
+        return connection.execute(
+            "SELECT runs.id, runs.mode, runs.started, runs.status, "
+            "(SELECT COUNT(*) FROM entries WHERE entries.run_id = runs.id) "
+            "FROM runs ORDER BY runs.id DESC").fetchall()
+    finally:
+        connection.close()
+
+def _remove_links(entries):
+    """Unlink destinations that still point at their source; returns (removed, kept destinations, parent dirs).
+
+    A hardlink is kept when its source is gone or it has no other link, since it
+    is then the last copy of the data.
+    """
+    removed = []
+    kept = []
+    parents = set()
+    for source, destination, link_type in entries:
+        try:
+            if link_type == 'symlink':
+                if os.readlink(destination) != source:
+                    continue
+            else:
+                if not os.path.exists(source) or os.stat(destination).st_nlink == 1:
+                    kept.append(destination)
+                    continue
+                if not os.path.samefile(source, destination):
+                    # The destination was replaced by something else since the run
+                    continue
+            os.unlink(destination)
+        except OSError:
+            continue
+        removed.append(destination)
+        parents.add(os.path.dirname(destination))
+    return removed, kept, parents
+
+def _prune_empty_dirs(directories, stop_at):
+    """Remove empty directories, deepest first, without going above stop_at."""
+    stop_at = os.path.abspath(stop_at)
+    candidates = set()
+    for directory in directories:
+        directory = os.path.abspath(directory)
+        while directory.startswith(stop_at + os.sep):
+            candidates.add(directory)
+            directory = os.path.dirname(directory)
+    for directory in sorted(candidates, key=lambda d: d.count(os.sep), reverse=True):
+        try:
+            os.rmdir(directory)
+        except OSError:
+            pass  # Not empty
+
+def _undo_entries(connection, output_path, condition, params, workers=16, chunk_size=10000):
+    """Remove the links of the manifest entries matching condition and delete those entries."""
+    removed = []
+    kept = []
+    parents = set()
+    cursor = connection.execute(f"SELECT source, destination, link_type FROM entries WHERE {condition}", params)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            # Unlinks release the GIL, so several threads keep the filesystem busy
+            step = max(1, len(rows) // workers + 1)
+            for destinations, last_copies, dirs in executor.map(_remove_links, [rows[i:i + step] for i in range(0, len(rows), step)]):
+                removed.extend(destinations)
+                kept.extend(last_copies)
+                parents.update(dirs)
+
+    _prune_empty_dirs(parents, output_path)
+    remove_from_index(output_path, removed)
+    with connection:
+        connection.execute(f"DELETE FROM entries WHERE {condition}", params)
+    return len(removed), kept
+
+def undo_run(output_path, run_id=None, workers=16, chunk_size=10000, status='undone'):
+    """Remove the links created by a run (the latest completed one by default).
+
+    Returns (number removed, destinations kept because they are the last copy of a file).
+    """
+    connection = connect_manifest(output_path)
+    try:
+        if run_id is None:
+            row = connection.execute(
+                "SELECT id FROM runs WHERE status IN ('completed', 'running') ORDER BY id DESC LIMIT 1").fetchone()
+            if row is None:
+                return 0, []
+            run_id = row[0]
+
+        removed, kept = _undo_entries(connection, output_path, "run_id = ?", (run_id,), workers, chunk_size)
+        with connection:
+            connection.execute("UPDATE runs SET status = ?, finished = ? WHERE id = ?", (status, time.time(), run_id))
+        return removed, kept
+    finally:
+        connection.close()
@@ -0,0 +1,116 @@
+import os
+import sqlite3
+
+INDEX_NAME = '.organizer_index.sqlite'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    destination TEXT NOT NULL UNIQUE,
+    source TEXT NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS documents USING fts5(
+    filename, folder, description, content,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+class SearchIndex:
+    """Full-text index of generated descriptions and extracted text, keyed by destination path.
+
+    Each output folder has its own index next to the run manifest. Rows in the
+    FTS5 table share their rowid with the `files` table, so replacing or removing
+    a destination touches exactly one row in each.
+    """
+
+    def __init__(self, output_path):
+        os.makedirs(output_path, exist_ok=True)
+        self.path = os.path.join(output_path, INDEX_NAME)
+        self._connection = sqlite3.connect(self.path)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+
+    def add(self, entries):
+        """Insert or replace entries: dicts with destination, source, folder, filename, description, content."""
+        count = 0
+        with self._connection:
+            for entry in entries:
+                self._delete(entry['destination'])
+                cursor = self._connection.execute(
+                    "INSERT INTO files (destination, source) VALUES (?, ?)", (entry['destination'], entry['source']))
+                self._connection.execute(
+                    "INSERT INTO documents (rowid, filename, folder, description, content) VALUES (?, ?, ?, ?, ?)",
+                    (cursor.lastrowid, entry.get('filename', ''), entry.get('folder', ''),
+                     entry.get('description') or '', entry.get('content') or ''))
+                count += 1
+        return count
+
+    def _delete(self, destination):
+        row = self._connection.execute("SELECT id FROM files WHERE destination = ?", (destination,)).fetchone()
+        if row is not None:
+            self._connection.execute("DELETE FROM documents WHERE rowid = ?", row)
+            self._connection.execute("DELETE FROM files WHERE id = ?", row)
+
+    def remove(self, destinations):
+        """Remove entries for destinations that were deleted or moved."""
+        with self._connection:
+            for destination in destinations:
+                self._delete(destination)
+
+    def prune_missing(self):
+        """Drop entries whose destination no longer exists; returns how many were removed."""
+        missing = [destination for (destination,) in self._connection.execute("SELECT destination FROM files")
+                   if not os.path.lexists(destination)]
+        self.remove(missing)
+        return len(missing)
+
+    def search(self, query, limit=20):
+        """Return (destination, folder, snippet) rows ranked by relevance."""
+        sql = ("SELECT files.destination, documents.folder, "
+               "snippet(documents, -1, '[', ']', '…', 12) "
+               "FROM documents JOIN files ON files.id = documents.rowid "
+               "WHERE documents MATCH ? "
+               # Matches in the filename and folder count more than matches in the body
+               "ORDER BY bm25(documents, 4.0, 3.0, 2.0, 1.0) LIMIT ?")
+        try:
+            return self._connection.execute(sql, (query, limit)).fetchall()
+        except sqlite3.OperationalError:
+            # Not valid FTS5 syntax; search for the words as plain terms instead
+            terms = ' '.join('"' + word.replace('"', '""') + '"' for word in query.split())
+            return self._connection.execute(sql, (terms, limit)).fetchall() if terms else []
+
+    def close(self):
+        self._connection.close()
+
+def index_operations(output_path, operations, all_data):
+    """Index the destinations created for analyzed files; returns the number indexed."""
+    data_by_path = {data['file_path']: data for data in all_data}
+    entries = []
+    for operation in operations:
+        data = data_by_path.get(operation['source'])
+        if data is None or not os.path.lexists(operation['destination']):
+            continue
+        entries.append({
+            'destination': operation['destination'],
+            'source': operation['source'],
+            'folder': data['foldername'],
+            'filename': data['filename'],
+            'description': data.get('description'),
+            'content': data.get('content'),
+        })
+    index = SearchIndex(output_path)
+    try:
+        return index.add(entries)
+    finally:
+        index.close()
+
+def remove_from_index(output_path, destinations):
+    """Drop removed destinations from the output folder's index, if it has one."""
+    if not destinations or not os.path.exists(os.path.join(output_path, INDEX_NAME)):
+        return
+    index = SearchIndex(output_path)
+    try:
+        index.remove(destinations)
+    finally:
+        index.close()
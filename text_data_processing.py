@@ -6,120 +6,157 @@ from nltk.tokenize import word_tokenize, sent_tokenize
 from nltk.corpus import stopwords
 from nltk.probability import FreqDist
 from nltk.stem import WordNetLemmatizer
-from rich.progress import Progress, TextColumn, BarColumn, TimeElapsedColumn
 from data_processing_common import sanitize_filename
+from progress_dashboard import RunDashboard
+from log_writer import log_message, log_record
+from generation import (
+    stream_completion,
+    generate_short_answer,
+    generate_within_budget,
+    GenerationTimeout,
+    LatencyBudget,
+    SUMMARY_MAX_TOKENS,
+    TRUNCATED_INPUT_CHARS,
+)
+
+# Prompts are split into a fixed prefix and a per-file suffix so the prefix can be
+# evaluated once and reused by the prefix cache (see prompt_cache.py)
+SUMMARY_PROMPT_PREFIX = """Provide a concise and accurate summary of the following text, focusing on the main ideas and key details.
+Limit your summary to a maximum of 150 words.
+
+"""
+
+FILENAME_PROMPT_PREFIX = """Based on the summary given at the end, generate a specific and descriptive filename that captures the essence of the document.
+Limit the filename to a maximum of 3 words. Use nouns and avoid starting with verbs like 'depicts', 'shows', 'presents', etc.
+Do not include any data type words like 'text', 'document', 'pdf', etc. Use only letters and connect words with underscores.
+
+Examples:
+1. Summary: A research paper on the fundamentals of string theory.
+   Filename: fundamentals_of_string_theory
+
+2. Summary: An article discussing the effects of climate change on polar bears.
+   Filename: climate_change_polar_bears
+
+Output only the filename, without any additional text.
+
+Now generate the filename.
+
+"""
+
+FOLDERNAME_PROMPT_PREFIX = """Based on the summary given at the end, generate a general category or theme that best represents the main subject of this document.
+This will be used as the folder name. Limit the category to a maximum of 2 words. Use nouns and avoid verbs.
+Do not include specific details, words from the filename, or any generic terms like 'untitled' or 'unknown'.
+
+Examples:
+1. Summary: A research paper on the fundamentals of string theory.
+   Category: physics
+
+2. Summary: An article discussing the effects of climate change on polar bears.
+   Category: environment
+
+Output only the category, without any additional text.
+
+Now generate the category.
+
+"""
+
+# Adapts to how long text files take on this machine, across batches
+latency_budget = LatencyBudget()
+
+PROMPT_PREFIXES = (SUMMARY_PROMPT_PREFIX, FILENAME_PROMPT_PREFIX, FOLDERNAME_PROMPT_PREFIX)
 
 def summarize_text_content(text, text_inference):
     """Summarize the given text content."""
-    prompt = f"""Provide a concise and accurate summary of the following text, focusing on the main ideas and key details.
-Limit your summary to a maximum of 150 words.
-
-Text: {text}
+    prompt = SUMMARY_PROMPT_PREFIX + f"""Text: {text}
 
 Summary:"""
 
-    response = text_inference.create_completion(prompt)
-    summary = response['choices'][0]['text'].strip()
+    summary = stream_completion(text_inference, prompt, SUMMARY_MAX_TOKENS).strip()
     return summary
 
-def process_single_text_file(args, text_inference, silent=False, log_file=None):
+def process_single_text_file(args, text_inference, dashboard, silent=False, log_file=None, generate_foldername=True):
     """Process a single text file to generate metadata."""
     file_path, text = args
     start_time = time.time()
 
-    # Create a Progress instance for this file
-    with Progress(
-        TextColumn("[progress.description]{task.description}"),
-        BarColumn(),
-        TimeElapsedColumn()
-    ) as progress:
-        task_id = progress.add_task(f"Processing {os.path.basename(file_path)}", total=1.0)
-        foldername, filename, description = generate_text_metadata(text, file_path, progress, task_id, text_inference)
+    dashboard.file_started(file_path)
+    metadata, fallback = generate_within_budget(
+        lambda: generate_text_metadata(text, file_path, dashboard, text_inference, generate_foldername),
+        lambda: generate_text_metadata(text[:TRUNCATED_INPUT_CHARS], file_path, dashboard, text_inference, generate_foldername),
+        latency_budget,
+    )
+    if metadata is None:
+        # Out of time twice: keep the original name and leave the file for a human to sort
+        stem = os.path.splitext(os.path.basename(file_path))[0]
+        metadata = 'others', sanitize_filename(stem), ''
+    foldername, filename, description = metadata
+    dashboard.file_finished(file_path)
 
     end_time = time.time()
     time_taken = end_time - start_time
 
     message = f"File: {file_path}\nTime taken: {time_taken:.2f} seconds\nDescription: {description}\nFolder name: {foldername}\nGenerated filename: {filename}\n"
+    if fallback:
+        message += f"Fallback: {fallback} (out of time)\n"
     if silent:
-        if log_file:
-            with open(log_file, 'a') as f:
-                f.write(message + '\n')
+        log_message(log_file, message)
     else:
         print(message)
+    log_record(log_file, event='analyze', path=file_path, seconds=time_taken, description=description,
+               foldername=foldername, filename=filename, fallback=fallback)
     return {
         'file_path': file_path,
         'foldername': foldername,
         'filename': filename,
-        'description': description
+        'description': description,
+        'content': text,  # Kept for the search index
+        'fallback': fallback
     }
 
-def process_text_files(text_tuples, text_inference, silent=False, log_file=None):
+def process_text_files(text_tuples, text_inference, silent=False, log_file=None, dashboard=None, generate_foldername=True):
     """Process text files sequentially."""
+    if dashboard is None:
+        # No run-level display was provided, so show one for this batch only
+        with RunDashboard(total=len(text_tuples), description="Processing text files") as dashboard:
+            return process_text_files(text_tuples, text_inference, silent=silent, log_file=log_file, dashboard=dashboard,
+                                      generate_foldername=generate_foldername)
     results = []
     for args in text_tuples:
-        data = process_single_text_file(args, text_inference, silent=silent, log_file=log_file)
+        data = process_single_text_file(args, text_inference, dashboard, silent=silent, log_file=log_file,
+                                        generate_foldername=generate_foldername)
         results.append(data)
     return results
 
-def generate_text_metadata(input_text, file_path, progress, task_id, text_inference):
+def generate_text_metadata(input_text, file_path, dashboard, text_inference, generate_foldername=True):
     """Generate description, folder name, and filename for a text document."""
 
-    # Total steps in processing a text file
-    total_steps = 3
-
     # Step 1: Generate description
-    description = summarize_text_content(input_text, text_inference)
-    progress.update(task_id, advance=1 / total_steps)
+    with dashboard.stage('summary'):
+        description = summarize_text_content(input_text, text_inference)
 
     # Step 2: Generate filename
-    filename_prompt =  f"""Based on the summary below, generate a specific and descriptive filename that captures the essence of the document.
-Limit the filename to a maximum of 3 words. Use nouns and avoid starting with verbs like 'depicts', 'shows', 'presents', etc.
-Do not include any data type words like 'text', 'document', 'pdf', etc. Use only letters and connect words with underscores.
-
-Summary: {description}
-
-Examples:
-1. Summary: A research paper on the fundamentals of string theory.
-   Filename: fundamentals_of_string_theory
-
-2. Summary: An article discussing the effects of climate change on polar bears.
-   Filename: climate_change_polar_bears
-
-Now generate the filename.
-
-Output only the filename, without any additional text.
+    filename_prompt = FILENAME_PROMPT_PREFIX + f"""Summary: {description}
 
 Filename:"""
-    filename_response = text_inference.create_completion(filename_prompt)
-    filename = filename_response['choices'][0]['text'].strip()
-    # Remove 'Filename:' prefix if present
-    filename = re.sub(r'^Filename:\s*', '', filename, flags=re.IGNORECASE).strip()
-    progress.update(task_id, advance=1 / total_steps)
+    # Out of time after the summary: leave the names empty so they are derived from it below
+    with dashboard.stage('filename'):
+        try:
+            filename = generate_short_answer(text_inference, filename_prompt, 'Filename')
+        except GenerationTimeout:
+            filename = ''
 
     # Step 3: Generate folder name from summary
-    foldername_prompt = f"""Based on the summary below, generate a general category or theme that best represents the main subject of this document.
-This will be used as the folder name. Limit the category to a maximum of 2 words. Use nouns and avoid verbs.
-Do not include specific details, words from the filename, or any generic terms like 'untitled' or 'unknown'.
-
-Summary: {description}
-
-Examples:
-1. Summary: A research paper on the fundamentals of string theory.
-   Category: physics
-
-2. Summary: An article discussing the effects of climate change on polar bears.
-   Category: environment
-
-Now generate the category.
-
-Output only the category, without any additional text.
+    # Skipped when folders are assigned afterwards by clustering the descriptions
+    foldername = None
+    if generate_foldername:
+        foldername_prompt = FOLDERNAME_PROMPT_PREFIX + f"""Summary: {description}
 
 Category:"""
-    foldername_response = text_inference.create_completion(foldername_prompt)
-    foldername = foldername_response['choices'][0]['text'].strip()
-    # Remove 'Category:' prefix if present
-    foldername = re.sub(r'^Category:\s*', '', foldername, flags=re.IGNORECASE).strip()
-    progress.update(task_id, advance=1 / total_steps)
+        with dashboard.stage('category'):
+            try:
+                foldername = generate_short_answer(text_inference, foldername_prompt, 'Category')
+            except GenerationTimeout:
+                foldername = ''
 
     # Remove unwanted words and stopwords
     unwanted_words = set([
@@ -169,13 +206,15 @@ Category:"""
     sanitized_filename = sanitize_filename(filename, max_words=3)
 
     # Process foldername
-    foldername = clean_ai_output(foldername, max_words=2)
-    if not foldername or foldername.lower() in ('untitled', ''):
-        # Attempt to extract keywords from the description
-        foldername = clean_ai_output(description, max_words=2)
-        if not foldername:
-            foldername = 'documents'
-
-    sanitized_foldername = sanitize_filename(foldername, max_words=2)
+    sanitized_foldername = None
+    if generate_foldername:
+        foldername = clean_ai_output(foldername, max_words=2)
+        if not foldername or foldername.lower() in ('untitled', ''):
+            # Attempt to extract keywords from the description
+            foldername = clean_ai_output(description, max_words=2)
+            if not foldername:
+                foldername = 'documents'
+
+        sanitized_foldername = sanitize_filename(foldername, max_words=2)
 
     return sanitized_foldername, sanitized_filename, description
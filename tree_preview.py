@@ -0,0 +1,113 @@
+import os
+
+class FolderNode:
+    """Aggregated view of one destination folder: subfolders, a few sample files, and totals."""
+
+    __slots__ = ('children', 'sample_files', 'file_count', 'total_files', 'total_bytes')
+
+    def __init__(self):
+        self.children = {}
+        self.sample_files = []
+        self.file_count = 0      # Files directly in this folder
+        self.total_files = 0     # Files in this folder and below
+        self.total_bytes = 0
+
+def summarize_operations(operations, base_path, max_samples=20, with_sizes=True):
+    """Aggregate proposed destinations into a folder tree with per-folder counts and bytes.
+
+    Only folders and up to `max_samples` file names per folder are kept, so memory
+    grows with the number of folders rather than the number of files.
+    """
+    root = FolderNode()
+    for op in operations:
+        rel_path = os.path.relpath(op['destination'], base_path)
+        *folders, file_name = rel_path.split(os.sep)
+        size = 0
+        if with_sizes:
+            try:
+                size = os.stat(op['source']).st_size
+            except OSError:
+                pass
+
+        node = root
+        node.total_files += 1
+        node.total_bytes += size
+        for folder in folders:
+            child = node.children.get(folder)
+            if child is None:
+                child = node.children[folder] = FolderNode()
+            node = child
+            node.total_files += 1
+            node.total_bytes += size
+        node.file_count += 1
+        if len(node.sample_files) < max_samples:
+            node.sample_files.append(file_name)
+    return root
+
+def format_size(num_bytes):
+    """Format a byte count with a binary unit."""
+    size = float(num_bytes)
+    for unit in ('B', 'KB', 'MB', 'GB', 'TB'):
+        if size < 1024 or unit == 'TB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+def _folder_label(name, node, with_sizes):
+    label = f"{name}/ ({node.total_files} files"
+    if with_sizes:
+        label += f", {format_size(node.total_bytes)}"
+    return label + ")"
+
+def render_tree(root, list_children, max_depth=3):
+    """Print a tree iteratively, in the style of the 'tree' command; returns True if anything was hidden.
+
+    `list_children(node, depth)` returns the entries to show as (label, child)
+    pairs, where child is None for a leaf, and the number of entries left out,
+    which is summarized as '… N more'. Children below `max_depth` are not expanded.
+    """
+    truncated = False
+    # Stack items are ('line', text) to print or ('node', node, prefix, depth) to expand
+    stack = [('node', root, '', 0)]
+    while stack:
+        item = stack.pop()
+        if item[0] == 'line':
+            print(item[1])
+            continue
+
+        _, node, prefix, depth = item
+        entries, hidden = list_children(node, depth)
+        lines = []
+        for index, (label, child) in enumerate(entries):
+            is_last = index == len(entries) - 1 and hidden == 0
+            lines.append(('line', prefix + ('└── ' if is_last else '├── ') + label))
+            if child is None:
+                continue
+            if depth + 1 < max_depth:
+                lines.append(('node', child, prefix + ('    ' if is_last else '│   '), depth + 1))
+            else:
+                truncated = True
+        if hidden > 0:
+            truncated = True
+            lines.append(('line', prefix + f"└── … {hidden} more"))
+
+        # Push in reverse so entries are printed in order
+        stack.extend(reversed(lines))
+    return truncated
+
+def print_tree_summary(root, max_depth=3, max_entries=20, with_sizes=True):
+    """Print a depth- and fan-out-limited view of a summarized tree; returns True if anything was hidden."""
+    def list_children(node, depth):
+        # Folders first, then sample files in the slots that are left
+        entries = [(_folder_label(name, node.children[name], with_sizes), node.children[name])
+                   for name in sorted(node.children)[:max_entries]]
+        entries += [(name, None) for name in sorted(node.sample_files)[:max(max_entries - len(entries), 0)]]
+        return entries, len(node.children) + node.file_count - len(entries)
+
+    return render_tree(root, list_children, max_depth)
+
+def export_plan(operations, path):
+    """Write every proposed operation as a tab-separated line: source, destination, link type."""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("source\tdestination\tlink_type\n")
+        for op in operations:
+            f.write(f"{op['source']}\t{op['destination']}\t{op['link_type']}\n")
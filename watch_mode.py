@@ -0,0 +1,247 @@
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+
+# inotify event masks (see <sys/inotify.h>)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+EVENT_HEADER = struct.Struct('iIII')
+
+def _is_hidden(name):
+    return name.startswith('.')
+
+def _is_within(path, directory):
+    """Return True if path is directory or lies below it."""
+    if directory is None:
+        return False
+    path, directory = os.path.abspath(path), os.path.abspath(directory)
+    return path == directory or path.startswith(directory.rstrip(os.sep) + os.sep)
+
+class InotifyWatcher:
+    """Report changed files below a directory using Linux inotify through ctypes."""
+
+    def __init__(self, root, ignore_dir=None):
+        libc_name = ctypes.util.find_library('c')
+        if sys.platform != 'linux' or not libc_name:
+            raise OSError("inotify is only available on Linux")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.root = root
+        self.ignore_dir = ignore_dir
+        self._watches = {}
+        self.overflowed = False
+        self._add_tree(root, [])
+
+    def _add_watch(self, path):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error == errno.ENOSPC:
+                raise OSError(error, "inotify watch limit reached; raise fs.inotify.max_user_watches or use polling")
+            return
+        self._watches[wd] = path
+
+    def _add_tree(self, path, found):
+        """Watch a directory and everything below it, collecting files already present."""
+        stack = [path]
+        while stack:
+            current = stack.pop()
+            if _is_within(current, self.ignore_dir):
+                continue
+            self._add_watch(current)
+            try:
+                with os.scandir(current) as entries:
+                    for entry in entries:
+                        if _is_hidden(entry.name):
+                            continue
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            found.append(entry.path)
+            except OSError:
+                continue
+        return found
+
+    def poll(self, timeout):
+        """Wait up to timeout seconds and return the set of file paths that changed."""
+        changed = set()
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return changed
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+
+                if mask & IN_Q_OVERFLOW:
+                    self.overflowed = True
+                    continue
+                directory = self._watches.get(wd)
+                if mask & IN_IGNORED:
+                    self._watches.pop(wd, None)
+                    continue
+                if directory is None or not name:
+                    continue
+                name = os.fsdecode(name)
+                if _is_hidden(name):
+                    continue
+                path = os.path.join(directory, name)
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        # Files may land in a new directory before its watch exists
+                        changed.update(self._add_tree(path, []))
+                elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE):
+                    changed.add(path)
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+class PollingWatcher:
+    """Fallback watcher that compares (mtime, size) snapshots at a fixed interval."""
+
+    def __init__(self, root, interval=5.0, ignore_dir=None):
+        self.root = root
+        self.interval = interval
+        self.ignore_dir = ignore_dir
+        self.overflowed = False
+        self._snapshot = self._scan()
+
+    def _scan(self):
+        snapshot = {}
+        stack = [self.root]
+        while stack:
+            current = stack.pop()
+            if _is_within(current, self.ignore_dir):
+                continue
+            try:
+                with os.scandir(current) as entries:
+                    for entry in entries:
+                        if _is_hidden(entry.name):
+                            continue
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            stat = entry.stat(follow_symlinks=False)
+                            snapshot[entry.path] = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                continue
+        return snapshot
+
+    def poll(self, timeout):
+        time.sleep(min(timeout, self.interval))
+        snapshot = self._scan()
+        previous, self._snapshot = self._snapshot, snapshot
+        changed = {path for path, signature in snapshot.items() if previous.get(path) != signature}
+        changed.update(path for path in previous if path not in snapshot)
+        return changed
+
+    def close(self):
+        pass
+
+def create_watcher(root, ignore_dir=None, force_polling=False, poll_interval=5.0):
+    """Create an inotify watcher, falling back to polling where inotify is unavailable."""
+    if not force_polling:
+        try:
+            return InotifyWatcher(root, ignore_dir=ignore_dir)
+        except OSError as e:
+            print(f"inotify unavailable ({e}); falling back to polling every {poll_interval:.0f} seconds.")
+    return PollingWatcher(root, interval=poll_interval, ignore_dir=ignore_dir)
+
+def file_signature(path):
+    """Return (mtime_ns, size) of a regular file, or None if it is gone."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size) if os.path.isfile(path) else None
+
+def watch_directory(input_path, process_batch, ignore_dir=None, debounce=2.0, max_delay=30.0,
+                    force_polling=False, poll_interval=5.0, process_existing=False):
+    """Call process_batch with new or changed files under input_path until interrupted.
+
+    Events are coalesced until the tree has been quiet for `debounce` seconds (or
+    `max_delay` seconds have passed since the first pending event), and a file is
+    only handed over again if its (mtime, size) signature changed.
+    """
+    watcher = create_watcher(input_path, ignore_dir=ignore_dir, force_polling=force_polling, poll_interval=poll_interval)
+    seen = {}
+    pending = set()
+    for root, _, files in os.walk(input_path):
+        if _is_within(root, ignore_dir):
+            continue
+        for name in files:
+            if not _is_hidden(name):
+                path = os.path.join(root, name)
+                if process_existing:
+                    pending.add(path)
+                else:
+                    seen[path] = file_signature(path)
+
+    first_event = time.monotonic() if pending else None
+    last_event = first_event
+    print(f"Watching {os.path.abspath(input_path)} for new files. Press Ctrl+C to stop.")
+    try:
+        while True:
+            changed = watcher.poll(debounce)
+            now = time.monotonic()
+            if watcher.overflowed:
+                # The kernel queue overflowed, so resynchronise with a single walk
+                watcher.overflowed = False
+                for root, _, files in os.walk(input_path):
+                    if not _is_within(root, ignore_dir):
+                        changed.update(os.path.join(root, name) for name in files if not _is_hidden(name))
+            if changed:
+                pending.update(changed)
+                last_event = now
+                first_event = first_event or now
+
+            if not pending or (now - last_event < debounce and now - first_event < max_delay):
+                continue
+
+            batch = []
+            for path in sorted(pending):
+                signature = file_signature(path)
+                if signature is None:
+                    seen.pop(path, None)
+                elif seen.get(path) != signature:
+                    seen[path] = signature
+                    batch.append(path)
+            pending.clear()
+            first_event = last_event = None
+            if batch:
+                try:
+                    process_batch(batch)
+                except Exception as e:
+                    # Keep watching; the files are picked up again once they change
+                    print(f"Error organizing {len(batch)} file(s): {e}")
+    except KeyboardInterrupt:
+        print("Stopped watching.")
+    finally:
+        watcher.close()